@@ -3,7 +3,16 @@ import sys
 import os
 import codecs
 import re
-from blessed import Terminal
+import select
+import time
+from asi_whisper.transcript_committer import TranscriptCommitter
+
+READ_CHUNK_BYTES = 1 << 16
+FRAME_RATE = 30
+MAX_ESCAPE_LENGTH = 32
+
+# CSI sequences, two-character escapes, and the carriage return / line feed that drive the line model
+CONTROL_PATTERN = re.compile(r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b[@-Z\\-_]|[\r\n]')
 
 def get_paths():
     current_directory = os.path.dirname(os.path.abspath(__file__))
@@ -42,7 +51,79 @@ def remove_unwanted_phrases(text):
     # Remove specific unwanted phrases like "2K"
     return text.replace('2K', '')
 
-def run_stream():
+class StreamParser:
+    # Tracks the terminal line whisper-neural-rtt keeps repainting and returns the
+    # lines it finalizes. Works on whole chunks: text runs are spliced into the line
+    # buffer in one slice assignment and control sequences are matched by regex.
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self.pending = ''
+        self.current_line = []
+        self.cursor_position = 0
+
+    def write_text(self, text: str) -> None:
+        if not text:
+            return
+        text = text.replace('\x1b', '')
+        end = self.cursor_position + len(text)
+        if self.cursor_position > len(self.current_line):
+            self.current_line.extend(' ' * (self.cursor_position - len(self.current_line)))
+        self.current_line[self.cursor_position:end] = text
+        self.cursor_position = end
+
+    def finalize_line(self):
+        line_text = ''.join(self.current_line).strip()
+        self.current_line.clear()
+        self.cursor_position = 0
+        if line_text:
+            line_text = remove_unwanted_characters(line_text).strip()
+        return line_text or None
+
+    def feed(self, data: bytes) -> list:
+        text = self.pending + self.decoder.decode(data)
+        self.pending = ''
+        lines = []
+        position = 0
+
+        for match in CONTROL_PATTERN.finditer(text):
+            self.write_text(text[position:match.start()])
+            position = match.end()
+            token = match.group()
+
+            if token == '\n':
+                line_text = self.finalize_line()
+                if line_text:
+                    lines.append(line_text)
+            elif token == '\r':
+                self.cursor_position = 0
+            elif token.endswith('K'):
+                # Erase in line; whisper-neural-rtt sends "ESC[2K" before each repaint
+                mode = token[2:-1] or '0'
+                if mode == '2':
+                    self.current_line[:] = ' ' * len(self.current_line)
+                elif mode == '0':
+                    del self.current_line[self.cursor_position:]
+
+        remainder = text[position:]
+        escape_index = remainder.rfind('\x1b')
+        if escape_index != -1 and len(remainder) - escape_index < MAX_ESCAPE_LENGTH:
+            # Hold back an escape sequence split across reads
+            self.pending = remainder[escape_index:]
+            remainder = remainder[:escape_index]
+        self.write_text(remainder)
+
+        return lines
+
+    def finish(self) -> list:
+        lines = self.feed(self.decoder.decode(b'', final=True).encode('utf-8'))
+        line_text = self.finalize_line()
+        if line_text:
+            lines.append(line_text)
+        return lines
+
+
+def run_stream(capture_path: str=None, on_line=None):
     whisper_coreml_rtt_path, model_path = get_paths()
 
     whisper_args = [
@@ -53,9 +134,9 @@ def run_stream():
         "--length", "10000"
     ]
 
-    full_transcription = []
-    current_line = []
-    cursor_position = 0
+    committer = TranscriptCommitter()
+    parser = StreamParser()
+    frame_interval = 1 / FRAME_RATE
 
     # Set sys.stdout encoding to UTF-8
     if hasattr(sys.stdout, 'reconfigure'):
@@ -63,105 +144,78 @@ def run_stream():
     else:
         sys.stdout = codecs.getwriter('utf-8')(sys.stdout.detach())
 
+    from blessed import Terminal
     term = Terminal()
+    capture_file = open(capture_path, 'wb') if capture_path else None
 
     with term.fullscreen(), term.hidden_cursor():
-        print(term.move(0, 0), end='')
+        print(term.move(0, 0), end='', flush=True)
+        terminal = sys.stdout.buffer
         with subprocess.Popen(
                 whisper_args,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
                 bufsize=0
         ) as proc:
+            pending_output = []
+            last_paint = 0.0
+
+            def emit(words):
+                if words and on_line:
+                    on_line(' '.join(words))
+
+            def commit(lines):
+                # Sliding windows overlap, so only the words past the committed tail are new
+                for line in lines:
+                    emit(committer.commit(line))
+
+            def paint():
+                nonlocal last_paint
+                if pending_output:
+                    terminal.write(b''.join(pending_output))
+                    terminal.flush()
+                    pending_output.clear()
+                last_paint = time.monotonic()
+
             try:
-                decoder = codecs.getincrementaldecoder('utf-8')()
-                in_escape_sequence = False
-                escape_sequence = ''
+                stdout_fd = proc.stdout.fileno()
                 while True:
-                    byte = proc.stdout.read(1)
-                    if not byte:
-                        break
-
-                    # Decode the byte
-                    try:
-                        char = decoder.decode(byte, final=False)
-                    except UnicodeDecodeError:
-                        # Skip invalid bytes
-                        continue
-
-                    if char:
-                        c = char
-
-                        # Write to stdout immediately
-                        sys.stdout.write(c)
-                        sys.stdout.flush()
-
-                        if in_escape_sequence:
-                            escape_sequence += c
-                            # Escape sequence ends when character is in the range '@' to '~'
-                            if '@' <= c <= '~':
-                                in_escape_sequence = False
-                                escape_sequence = ''
-                            # Do not add to current_line
-                            continue
-
-                        if c == '\x1b':
-                            # Start of escape sequence
-                            in_escape_sequence = True
-                            escape_sequence = c
-                            # Do not add to current_line
-                            continue
-
-                        if c == '\r':
-                            # Carriage return: reset cursor position
-                            cursor_position = 0
-                            continue
-
-                        if c == '\n':
-                            # Line feed: line is finalized
-                            line_text = ''.join(current_line).strip()
-                            if line_text:
-                                # Strip ANSI escape sequences
-                                line_text = strip_ansi_escape_sequences(line_text)
-                                # Remove any unwanted characters
-                                line_text = remove_unwanted_characters(line_text)
-                                if line_text:
-                                    full_transcription.append(line_text)
-                            current_line.clear()
-                            cursor_position = 0
-                            continue
-
-                        if in_escape_sequence:
-                            # Do not add escape sequence characters to current_line
-                            continue
-
-                        # Regular character; update current_line
-                        if cursor_position < len(current_line):
-                            current_line[cursor_position] = c
-                        else:
-                            current_line.append(c)
-                        cursor_position += 1
+                    ready, _, _ = select.select([stdout_fd], [], [], frame_interval)
+                    if ready:
+                        data = os.read(stdout_fd, READ_CHUNK_BYTES)
+                        if not data:
+                            break
+                        if capture_file:
+                            capture_file.write(data)
+                        pending_output.append(data)
+                        commit(parser.feed(data))
+
+                    # Repaint at most FRAME_RATE times per second
+                    if time.monotonic() - last_paint >= frame_interval:
+                        paint()
+                paint()
+                lines = parser.finish()
 
             except KeyboardInterrupt:
+                paint()
                 print("\n\nEnding real-time transcription.\n\n")
                 proc.terminate()
                 # Handle any remaining characters
-                if current_line:
-                    line_text = ''.join(current_line).strip()
-                    line_text = strip_ansi_escape_sequences(line_text)
-                    line_text = remove_unwanted_characters(line_text)
-                    if line_text:
-                        full_transcription.append(line_text)
+                lines = parser.finish()
             except Exception as e:
                 print(f"RTT Error: {e}")
                 raise
+            finally:
+                if capture_file:
+                    capture_file.close()
+
+            commit(lines)
+            emit(committer.finish())
 
     # Combine the full transcription
-    transcription = ' '.join(full_transcription)
-    # Remove "2K" from the transcription
-    transcription = remove_unwanted_phrases(transcription)
+    transcription = committer.text()
     return transcription
 
 
-def start():
-    return run_stream()
\ No newline at end of file
+def start(capture_path: str=None, on_line=None):
+    return run_stream(capture_path, on_line)
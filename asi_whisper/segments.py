@@ -0,0 +1,128 @@
+# Transcript segments kept as parallel arrays of start/end times (ms) plus offsets into one
+# text buffer, so a long transcript is one string and a few integer arrays rather than a
+# tuple and a line per segment. Every output format is exported from here without re-parsing.
+from array import array
+import io
+
+
+def format_timestamp(ms: int, separator: str=".") -> str:
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+class SegmentStore:
+
+    def __init__(self):
+        self.starts = array("q")
+        self.ends = array("q")
+        self.text_offsets = array("q", [0])
+        self.parts = []
+        self.buffer = ""
+
+    @classmethod
+    def from_segments(cls, segments) -> "SegmentStore":
+        store = cls()
+        for start_ms, end_ms, text in segments:
+            store.append(start_ms, end_ms, text)
+        return store
+
+    @classmethod
+    def from_text(cls, text: str, duration_ms: int=0) -> "SegmentStore":
+        # For backends that only return plain text
+        store = cls()
+        if text and text.strip():
+            store.append(0, duration_ms, text.strip())
+        return store
+
+    def append(self, start_ms: int, end_ms: int, text: str) -> None:
+        self.starts.append(start_ms)
+        self.ends.append(end_ms)
+        self.parts.append(text)
+        self.text_offsets.append(self.text_offsets[-1] + len(text))
+
+    def extend(self, other: "SegmentStore", offset_ms: int=0) -> None:
+        for start_ms, end_ms, text in other:
+            self.append(start_ms + offset_ms, end_ms + offset_ms, text)
+
+    def text_buffer(self) -> str:
+        # Appended text is joined into the single buffer on first read
+        if self.parts:
+            self.buffer += "".join(self.parts)
+            self.parts = []
+        return self.buffer
+
+    def text_at(self, index: int) -> str:
+        return self.text_buffer()[self.text_offsets[index]:self.text_offsets[index + 1]]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> (int, int, str):
+        return self.starts[index], self.ends[index], self.text_at(index)
+
+    def __iter__(self):
+        buffer = self.text_buffer()
+        for index in range(len(self.starts)):
+            yield (self.starts[index], self.ends[index],
+                   buffer[self.text_offsets[index]:self.text_offsets[index + 1]])
+
+    def duration_ms(self) -> int:
+        return self.ends[-1] if self.ends else 0
+
+    def to_text(self) -> str:
+        return " ".join(text.strip() for _, _, text in self if text.strip())
+
+    def to_timestamped(self) -> str:
+        # whisper.cpp's own "[t0 --> t1]   text" lines
+        return "\n".join(
+            f"[{format_timestamp(start_ms)} --> {format_timestamp(end_ms)}]   {text}" for start_ms, end_ms, text in self
+        )
+
+    def to_srt(self) -> str:
+        output = io.StringIO()
+        for number, (start_ms, end_ms, text) in enumerate(self, 1):
+            output.write(f"{number}\n{format_timestamp(start_ms, ',')} --> {format_timestamp(end_ms, ',')}\n"
+                         f"{text.strip()}\n\n")
+        return output.getvalue()
+
+    def to_vtt(self) -> str:
+        output = io.StringIO()
+        output.write("WEBVTT\n\n")
+        for start_ms, end_ms, text in self:
+            output.write(f"{format_timestamp(start_ms)} --> {format_timestamp(end_ms)}\n{text.strip()}\n\n")
+        return output.getvalue()
+
+    def to_markdown(self, paragraph_ms: int=60000, pause_ms: int=2000) -> str:
+        # One paragraph per minute or long pause, each led by its bold start time
+        paragraphs, current, paragraph_start, last_end = [], [], None, None
+        for start_ms, end_ms, text in self:
+            if current and (start_ms - paragraph_start >= paragraph_ms or start_ms - last_end >= pause_ms):
+                paragraphs.append(f"**[{format_timestamp(paragraph_start)[:8]}]** " + " ".join(current))
+                current = []
+            if not current:
+                paragraph_start = start_ms
+            current.append(text.strip())
+            last_end = end_ms
+        if current:
+            paragraphs.append(f"**[{format_timestamp(paragraph_start)[:8]}]** " + " ".join(current))
+        return "\n\n".join(paragraphs)
+
+    def export(self, transcript_format: str) -> str:
+        return FORMATS[transcript_format](self)
+
+    def notes(self, transcript_format: str) -> str:
+        # Subtitles go to their own file, so the notes get the readable Markdown transcript instead
+        return self.export("markdown" if transcript_format in SUBTITLE_FORMATS else transcript_format)
+
+
+SUBTITLE_FORMATS = ("srt", "vtt")
+
+FORMATS = {
+    "text": SegmentStore.to_text,
+    "timestamped": SegmentStore.to_timestamped,
+    "markdown": SegmentStore.to_markdown,
+    "srt": SegmentStore.to_srt,
+    "vtt": SegmentStore.to_vtt,
+}
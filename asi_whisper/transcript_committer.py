@@ -0,0 +1,90 @@
+import re
+
+TAIL_TOKENS = 128
+MIN_OVERLAP = 2
+REVISION_SLACK = 3
+
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9\']+')
+
+
+def normalize_token(word: str) -> str:
+    return NON_WORD_PATTERN.sub('', word.lower())
+
+
+def prefix_function(pattern: list) -> list:
+    failure = [0] * len(pattern)
+    k = 0
+    for index in range(1, len(pattern)):
+        while k and pattern[index] != pattern[k]:
+            k = failure[k - 1]
+        if pattern[index] == pattern[k]:
+            k += 1
+        failure[index] = k
+    return failure
+
+
+def align(tail: list, window: list) -> (int, int):
+    # Finds the longest prefix of `window` that ends within REVISION_SLACK tokens of the
+    # end of `tail` (KMP over the bounded tail). Returns (overlap length, end index in tail).
+    if not tail or not window:
+        return 0, len(tail)
+
+    failure = prefix_function(window)
+    best_length, best_end = 0, len(tail)
+    k = 0
+    for index, token in enumerate(tail):
+        while k and (k == len(window) or token != window[k]):
+            k = failure[k - 1]
+        if token == window[k]:
+            k += 1
+        end = index + 1
+        if end >= len(tail) - REVISION_SLACK and k >= best_length:
+            best_length, best_end = k, end
+    return best_length, best_end
+
+
+class TranscriptCommitter:
+    # whisper-neural-rtt finalizes overlapping sliding windows; this keeps one running
+    # transcript and only appends the words each window adds past what is committed.
+    # commit() returns words only once they are more than REVISION_SLACK words from the end,
+    # where a later window can no longer revise them; finish() returns the rest.
+
+    def __init__(self):
+        self.words = []
+        self.normalized = []
+        self.emitted = 0
+
+    def commit(self, line: str) -> list:
+        words = [word for word in line.split() if normalize_token(word)]
+        normalized = [normalize_token(word) for word in words]
+        if not words:
+            return []
+
+        tail = self.normalized[-TAIL_TOKENS:]
+        overlap, end = align(tail, normalized[:TAIL_TOKENS])
+
+        if overlap >= min(MIN_OVERLAP, len(normalized)):
+            if overlap == len(normalized):
+                # Nothing new, the window is already committed
+                return []
+            revised = len(tail) - end
+            if revised:
+                # The previous window's last words were re-heard differently; keep the newer reading
+                del self.words[-revised:]
+                del self.normalized[-revised:]
+            words, normalized = words[overlap:], normalized[overlap:]
+
+        self.words.extend(words)
+        self.normalized.extend(normalized)
+        return self.take(len(self.words) - REVISION_SLACK)
+
+    def take(self, end: int) -> list:
+        final = self.words[self.emitted:end] if end > self.emitted else []
+        self.emitted += len(final)
+        return final
+
+    def finish(self) -> list:
+        return self.take(len(self.words))
+
+    def text(self) -> str:
+        return ' '.join(self.words)
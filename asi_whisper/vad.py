@@ -0,0 +1,149 @@
+# Energy + zero-crossing-rate voice activity detection on normalized 16 kHz mono WAVs.
+# Speech regions are copied into one shorter WAV for the transcriber, and an offset map
+# takes timestamps on that WAV back to the original recording.
+import os, wave, bisect
+import numpy as np
+from asi_whisper import whisper_coreML
+import tracing
+
+FRAME_MS = 30
+READ_BLOCK_FRAMES = 2000
+NOISE_PERCENTILE = 10
+THRESHOLD_MARGIN_DB = 12
+MIN_THRESHOLD_DBFS = -55
+MAX_THRESHOLD_DBFS = -35
+# Quiet but noisy frames (fricatives like "s", "f") still count as speech near the threshold
+ZCR_THRESHOLD = 0.25
+ZCR_ENERGY_SLACK_DB = 8
+PADDING_MS = 250
+MIN_SILENCE_MS = 1000
+
+
+def frame_features(audio_path: str, frame_ms: int=FRAME_MS) -> (np.ndarray, np.ndarray):
+    # Reads the WAV a block at a time and returns per-frame level (dBFS) and zero-crossing rate
+    levels, crossings = [], []
+    with wave.open(audio_path, 'rb') as wav:
+        frame_samples = wav.getframerate() * frame_ms // 1000
+        while True:
+            block = wav.readframes(frame_samples * READ_BLOCK_FRAMES)
+            if not block:
+                break
+            samples = np.frombuffer(block, dtype=np.int16)
+            usable = len(samples) // frame_samples * frame_samples
+            if usable == 0:
+                break
+            frames = samples[:usable].reshape(-1, frame_samples).astype(np.float32) / 32768.0
+
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+            levels.append(20 * np.log10(np.maximum(rms, 1e-5)))
+            signs = np.signbit(frames)
+            crossings.append(np.mean(signs[:, 1:] != signs[:, :-1], axis=1))
+
+    if not levels:
+        return np.zeros(0), np.zeros(0)
+    return np.concatenate(levels), np.concatenate(crossings)
+
+
+def detect_speech(audio_path: str, margin_db: float=THRESHOLD_MARGIN_DB, min_silence_ms: int=MIN_SILENCE_MS,
+                  padding_ms: int=PADDING_MS, frame_ms: int=FRAME_MS) -> list:
+    # Returns [(start_ms, end_ms)] speech regions; only silences of min_silence_ms or more are dropped
+    levels, crossings = frame_features(audio_path, frame_ms)
+    if len(levels) == 0:
+        return []
+
+    noise_floor = float(np.percentile(levels, NOISE_PERCENTILE))
+    threshold = min(max(noise_floor + margin_db, MIN_THRESHOLD_DBFS), MAX_THRESHOLD_DBFS)
+    speech = (levels > threshold) | ((levels > threshold - ZCR_ENERGY_SLACK_DB) & (crossings > ZCR_THRESHOLD))
+
+    # Pad every speech frame on both sides, which also bridges gaps shorter than twice the padding
+    pad_frames = int(np.ceil(padding_ms / frame_ms))
+    if pad_frames:
+        speech = np.convolve(speech.astype(np.int32), np.ones(2 * pad_frames + 1, dtype=np.int32), mode="same") > 0
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+    with wave.open(audio_path, 'rb') as wav:
+        total_ms = round(wav.getnframes() * 1000 / wav.getframerate())
+
+    regions = []
+    for start_frame, end_frame in zip(edges[::2], edges[1::2]):
+        start_ms, end_ms = int(start_frame) * frame_ms, min(int(end_frame) * frame_ms, total_ms)
+        if regions and start_ms - regions[-1][1] < min_silence_ms:
+            regions[-1] = (regions[-1][0], end_ms)
+        else:
+            regions.append((start_ms, end_ms))
+
+    # Silences at the very start and end are only dropped when they are long, like any other
+    if regions and regions[0][0] < min_silence_ms:
+        regions[0] = (0, regions[0][1])
+    if regions and total_ms - regions[-1][1] < min_silence_ms:
+        regions[-1] = (regions[-1][0], total_ms)
+    return regions
+
+
+def compact(audio_path: str, regions: list, output_path: str) -> list:
+    # Writes only the speech regions; returns the offset map [(compact_start_ms, original_start_ms, duration_ms)]
+    offset_map = []
+    compact_ms = 0
+    partial_path = f"{output_path}.partial"
+    with wave.open(audio_path, 'rb') as source, wave.open(partial_path, 'wb') as output:
+        output.setparams(source.getparams())
+        rate = source.getframerate()
+        for start_ms, end_ms in regions:
+            source.setpos(start_ms * rate // 1000)
+            frame_count = (end_ms - start_ms) * rate // 1000
+            while frame_count > 0:
+                frames = min(frame_count, rate * 10)
+                output.writeframes(source.readframes(frames))
+                frame_count -= frames
+            offset_map.append((compact_ms, start_ms, end_ms - start_ms))
+            compact_ms += end_ms - start_ms
+    os.replace(partial_path, output_path)
+    return offset_map
+
+
+def region_starts(offset_map: list) -> list:
+    return [compact_start for compact_start, _, _ in offset_map]
+
+
+def remap(ms: int, offset_map: list, end: bool=False, starts: list=None) -> int:
+    # An end time exactly on a region boundary belongs to the region before it, not the next one
+    starts = starts if starts is not None else region_starts(offset_map)
+    index = (bisect.bisect_left(starts, ms) if end else bisect.bisect_right(starts, ms)) - 1
+    compact_start, original_start, duration = offset_map[max(index, 0)]
+    return original_start + min(max(ms - compact_start, 0), duration)
+
+
+def remap_segments(segments: list, offset_map: list) -> list:
+    starts = region_starts(offset_map)
+    return [
+        (remap(start_ms, offset_map, starts=starts), remap(end_ms, offset_map, end=True, starts=starts), text)
+        for start_ms, end_ms, text in segments
+    ]
+
+
+def speech_only_audio(audio_path: str, margin_db: float=THRESHOLD_MARGIN_DB,
+                      min_silence_ms: int=MIN_SILENCE_MS) -> (str, list):
+    # Returns the audio to transcribe and its offset map, or (normalized path, None) when
+    # there is too little silence to be worth skipping
+    normalized_path, audio_len = whisper_coreML.audio_normalizer(audio_path)
+    with tracing.span("vad", audio_seconds=audio_len) as attributes:
+        print("Detecting speech...")
+        regions = detect_speech(normalized_path, margin_db, min_silence_ms)
+        speech_ms = sum(end_ms - start_ms for start_ms, end_ms in regions)
+        skipped_seconds = audio_len - speech_ms / 1000
+        attributes.update(regions=len(regions), skipped_seconds=skipped_seconds)
+
+        if not regions:
+            print("\t\033[93mNo speech detected, transcribing the full recording\033[0m")
+            return normalized_path, None
+        if skipped_seconds < min_silence_ms / 1000:
+            print("\tNo long silences found")
+            return normalized_path, None
+
+        os.makedirs(whisper_coreML.NORMALIZED_AUDIO_DIR, exist_ok=True)
+        output_path = whisper_coreML.normalized_audio_path(normalized_path)[:-len(".wav")] + ".speech.wav"
+        offset_map = compact(normalized_path, regions, output_path)
+        whisper_coreML.keep_normalized(output_path)
+        print(f"\tSkipping {skipped_seconds:.0f}s of silence ({skipped_seconds / audio_len:.0%} of the recording) "
+              f"across {len(regions)} speech regions")
+        return output_path, offset_map
@@ -1,6 +1,31 @@
-import subprocess, threading, filetype, time, sys, re, os
-from pydub import AudioSegment
-import shlex
+import subprocess, threading, filetype, time, sys, re, os, tempfile, wave, hashlib, shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from disk_cache import CACHE_ROOT, evict_files
+import tracing
+from asi_whisper.segments import SegmentStore, format_timestamp
+
+try:
+    import audioop
+except ImportError:
+    import pyaudioop as audioop
+
+THREADS_PER_WORKER = 4
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER)
+MAX_SEGMENT_SECONDS = 300
+SILENCE_WINDOW_MS = 50
+MIN_SILENCE_MS = 400
+SILENCE_THRESHOLD_DBFS = -40
+SEGMENT_RETRIES = 2
+
+TARGET_SAMPLE_RATE = 16000
+NORMALIZE_BLOCK_BYTES = 1 << 16
+NORMALIZED_AUDIO_DIR = os.path.join(CACHE_ROOT, "normalized")
+# About 9 hours of 16 kHz audio; conversions are cheap to redo, so only recent ones are kept
+NORMALIZED_AUDIO_MAX_BYTES = int(os.getenv("NOTETAKER_NORMALIZED_CACHE_MB", "1024")) * 1024 * 1024
+
+output_lock = threading.Lock()
+
+SEGMENT_PATTERN = re.compile(r'\[(\d{2}):(\d{2}):(\d{2})\.(\d{3}) --> (\d{2}):(\d{2}):(\d{2})\.(\d{3})\]\s*(.*)')
 
 def countdown_timer(seconds, stop_event):
     max_dot_len = 6 + 1
@@ -13,9 +38,10 @@ def countdown_timer(seconds, stop_event):
         mins, secs = divmod(seconds, 60)
         time_str = make_time_str(mins, secs)
 
-        sys.stdout.write('\r' + ' ' * max_len + '\r')
-        sys.stdout.write(f"\033[94mApproximate time to completion: {time_str}{'.'*dot_index}\033[0m")
-        sys.stdout.flush()
+        with output_lock:
+            sys.stdout.write('\r' + ' ' * max_len + '\r')
+            sys.stdout.write(f"\033[94mApproximate time to completion: {time_str}{'.'*dot_index}\033[0m")
+            sys.stdout.flush()
 
         dot_index = (dot_index + 1) % max_dot_len
         time.sleep(1)
@@ -23,14 +49,16 @@ def countdown_timer(seconds, stop_event):
 
     dot_index = 0
     while not stop_event.is_set():
-        sys.stdout.write('\r' + ' ' * max_len + '\r')
-        sys.stdout.write(f"\033[93m\tAlmost there{'.'*dot_index}\033[0m")
-        sys.stdout.flush()
+        with output_lock:
+            sys.stdout.write('\r' + ' ' * max_len + '\r')
+            sys.stdout.write(f"\033[93m\tAlmost there{'.'*dot_index}\033[0m")
+            sys.stdout.flush()
         dot_index = (dot_index + 1) % max_dot_len
         time.sleep(1)
 
-    sys.stdout.write('\r' + ' ' * max_len + '\r')
-    sys.stdout.flush()
+    with output_lock:
+        sys.stdout.write('\r' + ' ' * max_len + '\r')
+        sys.stdout.flush()
 
 
 def make_time_str(minutes: int, seconds: int):
@@ -42,61 +70,325 @@ def make_time_str(minutes: int, seconds: int):
     return time_str
 
 
-def transcription_cleaner(raw_transcription: str) -> str:
-    pattern = re.compile(r'\[\d{2}:\d{2}:\d{2}\.\d{3} --> \d{2}:\d{2}:\d{2}\.\d{3}\]\s*(.*)')
+def get_paths() -> (str, str):
+    current_directory = os.path.dirname(os.path.abspath(__file__))
 
-    print(f"\tCleaning transcription...")
-    clean_transcription_lines = []
-    for line in raw_transcription.splitlines():
-        match = pattern.match(line)
-        if match:
-            clean_transcription_lines.append(match.group(0))
-    print(f"\tCleaned transcription.")
+    # WHISPER_NEURAL_BIN / WHISPER_NEURAL_MODEL point at another build (or stubs/whisper_neural.py)
+    model_path = os.path.normpath(
+        os.getenv("WHISPER_NEURAL_MODEL") or os.path.join(current_directory, "./models/ggml-base.en.bin")
+    )
+    whisper_coreml_path = os.path.normpath(
+        os.getenv("WHISPER_NEURAL_BIN") or os.path.join(current_directory, "./whisper-neural")
+    )
 
-    return "\n".join(clean_transcription_lines)
+    return whisper_coreml_path, model_path
 
 
-def audio_normalizer(audio_path: str) -> (str, int):
-    print(f"Normalizing audio...")
-    audio_type = filetype.guess(audio_path)
-    audio_len = 0
+def parse_segment_line(line: str):
+    # Returns (start_ms, end_ms, text) for a whisper.cpp "[t0 --> t1]  text" line, or None
+    match = SEGMENT_PATTERN.match(line)
+    if not match:
+        return None
+    h0, m0, s0, ms0, h1, m1, s1, ms1 = (int(group) for group in match.groups()[:8])
+    start_ms = ((h0 * 60 + m0) * 60 + s0) * 1000 + ms0
+    end_ms = ((h1 * 60 + m1) * 60 + s1) * 1000 + ms1
+    return start_ms, end_ms, match.group(9)
 
-    if audio_type:
-        audio = AudioSegment.from_file(audio_path, format=audio_type.extension)
 
-        if audio_type != "wav":
-            base_path = os.path.splitext(audio_path)[0]
-            audio_path = f"{base_path}.wav"
-            print(f"\tConverting audio to .wav")
+def is_normalized_wav(audio_path: str) -> bool:
+    try:
+        with wave.open(audio_path, 'rb') as wav:
+            return (
+                wav.getframerate() == TARGET_SAMPLE_RATE
+                and wav.getnchannels() == 1
+                and wav.getsampwidth() == 2
+                and wav.getcomptype() == "NONE"
+            )
+    except (wave.Error, EOFError, OSError):
+        return False
 
-        audio = audio.set_frame_rate(16000)
-        print(f"\tSet audio framerate to 16kHz")
-        audio.export(audio_path, format="wav")
-        audio_len = audio.duration_seconds
-        print(f"\tExported normalized audio to {audio_path}")
 
-    elif not audio_type:
-        raise ValueError("Audio file format could not be determined")
+def normalized_audio_path(audio_path: str) -> str:
+    # Keyed on the source's identity so repeated runs over the same file reuse the conversion
+    stat = os.stat(audio_path)
+    identity = f"{os.path.realpath(audio_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    digest = hashlib.sha1(identity.encode("utf-8")).hexdigest()[:16]
+    base_name = os.path.splitext(os.path.basename(audio_path))[0]
+    return os.path.join(NORMALIZED_AUDIO_DIR, f"{base_name}_{digest}.wav")
 
-    return (audio_path, audio_len)
 
+def keep_normalized(path: str) -> None:
+    # Marks path as recently used and evicts the oldest normalized WAVs past the size cap
+    os.utime(path)
+    evict_files(NORMALIZED_AUDIO_DIR, NORMALIZED_AUDIO_MAX_BYTES, ".wav", keep=path)
 
-def transcribe(audio_path: str) -> str:
+
+def audio_normalizer(audio_path: str) -> (str, int):
+    with tracing.span("normalize", input_bytes=os.path.getsize(audio_path)) as attributes:
+        print(f"Normalizing audio...")
+        audio_type = filetype.guess(audio_path)
+
+        if not audio_type:
+            raise ValueError("Audio file format could not be determined")
+
+        if is_normalized_wav(audio_path):
+            with wave.open(audio_path, 'rb') as wav:
+                audio_len = wav.getnframes() / TARGET_SAMPLE_RATE
+            print(f"\tAudio is already 16kHz mono PCM, skipping conversion")
+            attributes.update(audio_seconds=audio_len, converted=False)
+            return (audio_path, audio_len)
+
+        output_path = normalized_audio_path(audio_path)
+        if is_normalized_wav(output_path):
+            with wave.open(output_path, 'rb') as wav:
+                audio_len = wav.getnframes() / TARGET_SAMPLE_RATE
+            print(f"\tReusing normalized audio at {output_path}")
+            keep_normalized(output_path)
+            attributes.update(audio_seconds=audio_len, converted=False)
+            return (output_path, audio_len)
+
+        ffmpeg_path = shutil.which("ffmpeg")
+        if not ffmpeg_path:
+            raise RuntimeError("ffmpeg is required to normalize audio but was not found on PATH")
+
+        os.makedirs(NORMALIZED_AUDIO_DIR, exist_ok=True)
+        partial_path = f"{output_path}.partial"
+
+        # ffmpeg decodes, downmixes and resamples; we only ever hold one block of PCM in memory
+        command = [
+            ffmpeg_path, "-nostdin", "-v", "error",
+            "-i", audio_path,
+            "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE),
+            "-f", "s16le", "-acodec", "pcm_s16le", "-"
+        ]
+        print(f"\tConverting audio to 16kHz mono .wav")
+        frame_count = 0
+        # stderr goes to a file: a corrupt input can log more than a pipe holds while stdout is still being read
+        with tempfile.TemporaryFile() as error_file:
+            with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_file) as proc:
+                with wave.open(partial_path, 'wb') as wav:
+                    wav.setnchannels(1)
+                    wav.setsampwidth(2)
+                    wav.setframerate(TARGET_SAMPLE_RATE)
+                    while True:
+                        block = proc.stdout.read(NORMALIZE_BLOCK_BYTES)
+                        if not block:
+                            break
+                        wav.writeframesraw(block)
+                        frame_count += len(block) // 2
+
+            if proc.returncode != 0:
+                os.remove(partial_path)
+                error_file.seek(0)
+                error_output = error_file.read().decode("utf-8", errors="replace").strip().splitlines()
+                raise ValueError(f"Audio could not be decoded: {' '.join(error_output[-3:])}")
+
+        os.replace(partial_path, output_path)
+        keep_normalized(output_path)
+        audio_len = frame_count / TARGET_SAMPLE_RATE
+        print(f"\tExported normalized audio to {output_path}")
+        attributes.update(audio_seconds=audio_len, converted=True, output_bytes=os.path.getsize(output_path))
+
+        return (output_path, audio_len)
+
+
+def audio_duration(audio_path: str):
+    # Cheap length lookup for backend selection; None when it cannot be determined
+    try:
+        with wave.open(audio_path, 'rb') as wav:
+            return wav.getnframes() / wav.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+
+    ffprobe_path = shutil.which("ffprobe")
+    if not ffprobe_path:
+        return None
+    result = subprocess.run(
+        [ffprobe_path, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio_path],
+        capture_output=True, text=True
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def transcode_for_upload(wav_path: str, output_path: str, bitrate: str="24k") -> str:
+    # Opus at speech bitrates is ~10x smaller than 16 kHz PCM and is accepted by the cloud endpoint
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        raise RuntimeError("ffmpeg is required to compress audio but was not found on PATH")
+
+    command = [
+        ffmpeg_path, "-nostdin", "-v", "error", "-y",
+        "-i", wav_path,
+        "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE),
+        "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+        output_path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not compress {wav_path}: {result.stderr.strip()}")
+    return output_path
+
+
+def find_split_points(audio_path: str, max_segment_seconds: float=MAX_SEGMENT_SECONDS) -> (list, int):
+    # Walks the WAV in small windows and cuts each segment in the middle of its last
+    # long-enough silence, falling back to a hard cut once the segment is too long.
+    with wave.open(audio_path, 'rb') as wav:
+        rate = wav.getframerate()
+        width = wav.getsampwidth()
+        window_frames = max(1, rate * SILENCE_WINDOW_MS // 1000)
+        min_silence_frames = rate * MIN_SILENCE_MS // 1000
+        max_segment_frames = int(max_segment_seconds * rate)
+        threshold = (2 ** (8 * width - 1)) * 10 ** (SILENCE_THRESHOLD_DBFS / 20)
+
+        split_points = []
+        segment_start = 0
+        best_cut = None
+        quiet_start = None
+        position = 0
+
+        while True:
+            frames = wav.readframes(window_frames)
+            if not frames:
+                break
+            frame_count = len(frames) // (width * wav.getnchannels())
+
+            if audioop.rms(frames, width) < threshold:
+                if quiet_start is None:
+                    quiet_start = position
+                if position + frame_count - quiet_start >= min_silence_frames:
+                    best_cut = (quiet_start + position + frame_count) // 2
+            else:
+                quiet_start = None
+
+            position += frame_count
+
+            if position - segment_start >= max_segment_frames:
+                cut = best_cut if best_cut is not None and best_cut > segment_start else position
+                split_points.append(cut)
+                segment_start = cut
+                best_cut = None
+
+    return split_points, position
+
+
+def export_segments(audio_path: str, split_points: list, total_frames: int, segment_dir: str) -> list:
+    segments = []
+    boundaries = [0] + split_points + [total_frames]
+
+    with wave.open(audio_path, 'rb') as wav:
+        rate = wav.getframerate()
+        for index, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+            if end <= start:
+                continue
+            segment_path = os.path.join(segment_dir, f"segment_{index:04d}.wav")
+            wav.setpos(start)
+            with wave.open(segment_path, 'wb') as segment:
+                segment.setparams(wav.getparams())
+                segment.writeframes(wav.readframes(end - start))
+            segments.append((segment_path, start * 1000 // rate))
+
+    return segments
+
+
+def print_segment(start_ms: int, end_ms: int, text: str) -> None:
+    # Clears the countdown line, prints the segment, and lets the countdown redraw below it
+    with output_lock:
+        sys.stdout.write('\r' + ' ' * 80 + '\r')
+        sys.stdout.write(f"\033[2m[{format_timestamp(start_ms)[:8]}]\033[0m {text.strip()}\n")
+        sys.stdout.flush()
+
+
+def read_segments(command: list, offset_ms: int=0, on_segment=None) -> SegmentStore:
+    # Parses whisper-neural's stdout line by line as it runs instead of buffering all of it
+    store = SegmentStore()
+    with tempfile.TemporaryFile() as error_file:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_file, text=True, bufsize=1) as proc:
+            for line in proc.stdout:
+                parsed = parse_segment_line(line.rstrip("\n"))
+                if parsed:
+                    start_ms, end_ms, text = parsed
+                    store.append(start_ms + offset_ms, end_ms + offset_ms, text)
+                    if on_segment:
+                        on_segment(start_ms + offset_ms, end_ms + offset_ms, text)
+
+        if proc.returncode != 0:
+            error_file.seek(0)
+            error_output = error_file.read().decode("utf-8", errors="replace").strip().splitlines()
+            raise RuntimeError(f"whisper-neural exited with {proc.returncode}: {' '.join(error_output[-3:])}")
+    return store
+
+
+def transcribe_segment(segment_path: str, offset_ms: int, threads: int) -> SegmentStore:
+    whisper_coreml_path, model_path = get_paths()
+    command = [whisper_coreml_path, "-m", model_path, "-t", str(threads), "-f", segment_path]
+    return read_segments(command, offset_ms)
+
+
+def transcribe_parallel(audio_path: str, audio_len: float, workers: int=DEFAULT_WORKERS,
+                        on_segment=None) -> SegmentStore:
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    with tempfile.TemporaryDirectory(prefix="notetaker_segments_") as segment_dir:
+        split_points, total_frames = find_split_points(audio_path)
+        segment_files = export_segments(audio_path, split_points, total_frames, segment_dir)
+        print(f"\tSplit {audio_len:.0f}s of audio into {len(segment_files)} segments "
+              f"across {workers} workers ({threads} threads each).")
+
+        results = {}
+        attempts = {index: 0 for index in range(len(segment_files))}
+        # Chunks finish out of order; segments are reported once every chunk before them is done
+        next_to_report = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = {
+                pool.submit(transcribe_segment, path, offset_ms, threads): index
+                for index, (path, offset_ms) in enumerate(segment_files)
+            }
+            while pending:
+                future = next(as_completed(pending))
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                    print(f"\t\033[92mSegment {index + 1}/{len(segment_files)} finished "
+                          f"({len(results)}/{len(segment_files)} done).\033[0m")
+                    while on_segment and next_to_report in results:
+                        for start_ms, end_ms, text in results[next_to_report]:
+                            on_segment(start_ms, end_ms, text)
+                        next_to_report += 1
+                except Exception as e:
+                    attempts[index] += 1
+                    if attempts[index] > SEGMENT_RETRIES:
+                        raise RuntimeError(f"Segment {index + 1} failed after {attempts[index]} attempts: {e}")
+                    print(f"\t\033[93mSegment {index + 1} failed ({e}), retrying...\033[0m")
+                    path, offset_ms = segment_files[index]
+                    pending[pool.submit(transcribe_segment, path, offset_ms, threads)] = index
+
+    store = SegmentStore()
+    for index in sorted(results):
+        store.extend(results[index])
+    return store
+
+
+def transcribe(audio_path: str, workers: int=1, expected_seconds: float=None) -> SegmentStore:
 
     print("Preparing to run CoreML Whisper model...")
 
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    model_path = shlex.quote(
-        os.path.join(current_directory, "./models/ggml-base.en.bin")
-    )
-    whisper_coreml_path = shlex.quote(
-        os.path.join(current_directory, "./whisper-neural")
-    )
+    whisper_coreml_path, model_path = get_paths()
 
     audio_path, audio_len = audio_normalizer(audio_path)
-    audio_path = shlex.quote(audio_path)
 
-    expected_time = audio_len / 30
+    if workers > 1:
+        print(f"\nRunning CoreML Whisper model on {workers} parallel workers...")
+        try:
+            return transcribe_parallel(audio_path, audio_len, workers, on_segment=print_segment)
+        except Exception as e:
+            print(f"An error occurred in Whisper CoreML: {e}")
+            return None
+
+    expected_time = expected_seconds if expected_seconds is not None else audio_len / 30
 
     try:
         print("\nRunning CoreML Whisper model on Apple Neural Engine... Please be patient :)")
@@ -106,21 +398,18 @@ def transcribe(audio_path: str) -> str:
         countdown_thread.start()
 
         try:
-            command = f"{whisper_coreml_path} -m {model_path} -f {audio_path}"
-            result = subprocess.run(command, capture_output=True, text=True, shell=True)
+            store = read_segments([whisper_coreml_path, "-m", model_path, "-f", audio_path], on_segment=print_segment)
 
             print("\033[92m Finished!\033[0m")
         except KeyboardInterrupt:
             print("\033[91m\n\nSorry I took too long :,(\033[0m")
+            raise
+        finally:
             stop_event.set()
             countdown_thread.join()
-            raise
-
-        stop_event.set()
-        countdown_thread.join()
 
-        print(f"\tCoreML Whisper returned a result of length: {len(result.stdout)}.")
+        print(f"\tCoreML Whisper returned {len(store)} segments.")
 
-        return transcription_cleaner(result.stdout)
+        return store
     except Exception as e:
         print(f"An error occurred in Whisper CoreML: {e}")
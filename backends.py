@@ -0,0 +1,31 @@
+# Providers are registered by "module:function" so a backend's SDK (torch, whisper,
+# openai, ollama) is only imported once that backend is actually selected.
+import importlib
+
+SUMMARIZERS = {
+    "openai": "openai_handler:summarize",
+    "ollama": "ollama_handler:summarize",
+}
+
+TRANSCRIBERS = {
+    "whisper.cpp": "asi_whisper.whisper_coreML:transcribe",
+    "openai-whisper": "openai_handler:transcribe_local",
+    "openai-cloud": "openai_handler:transcribe_cloud",
+}
+
+
+def load(spec: str):
+    module_name, attribute = spec.split(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def summarizer(name: str):
+    if name not in SUMMARIZERS:
+        raise ValueError(f"Unknown summarization provider: {name}")
+    return load(SUMMARIZERS[name])
+
+
+def transcriber(name: str):
+    if name not in TRANSCRIBERS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+    return load(TRANSCRIBERS[name])
@@ -0,0 +1,204 @@
+import openai_handler, markdown_writer, tracing
+from pipeline import Pipeline, Stage
+from asi_whisper.segments import SUBTITLE_FORMATS
+import os, glob, json, time, threading
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".aac", ".mp4", ".webm")
+MANIFEST_NAME = "notetaker_manifest.jsonl"
+BATCH_STATE_NAME = "notetaker_batch_state.json"
+
+
+def collect_inputs(pattern: str) -> list:
+    if os.path.isdir(pattern):
+        paths = [
+            os.path.join(pattern, name) for name in os.listdir(pattern)
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+        ]
+    else:
+        paths = glob.glob(os.path.expanduser(pattern), recursive=True)
+    return sorted(os.path.normpath(os.path.abspath(path)) for path in paths if os.path.isfile(path))
+
+
+def title_from_filename(audio_path: str) -> str:
+    title = os.path.splitext(os.path.basename(audio_path))[0]
+    return " ".join(title.replace("_", " ").replace("-", " ").split()) or "output"
+
+
+def output_paths(inputs: list, output_dir: str) -> dict:
+    # Different recordings can reduce to the same notes ("lecture-1.mp3", "lecture_1.wav"); later
+    # ones in sorted order get a numeric suffix instead of overwriting the first one's notes.
+    # Built over every input, not just pending ones, so names stay stable when a batch resumes.
+    paths, taken = {}, set()
+    for audio_path in inputs:
+        base_title = title = title_from_filename(audio_path)
+        output_path = markdown_writer.output_pdf_path(title, output_dir)
+        number = 2
+        while output_path.lower() in taken:
+            title = f"{base_title} {number}"
+            output_path = markdown_writer.output_pdf_path(title, output_dir)
+            number += 1
+        if title != base_title:
+            print(f"\t\033[93m{os.path.basename(audio_path)} has the same title as another recording, "
+                  f"writing it to {os.path.basename(output_path)}\033[0m")
+        taken.add(output_path.lower())
+        paths[audio_path] = (title, output_path)
+    return paths
+
+
+class Manifest:
+    # Append-only JSONL log of every stage transition; the last record per file wins on resume.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.latest = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn final line from an interrupted run
+                        continue
+                    self.latest[record["file"]] = record
+
+    def is_complete(self, audio_path: str) -> bool:
+        record = self.latest.get(audio_path)
+        return bool(record) and record["stage"] == "complete" and record["status"] == "done"
+
+    def record(self, audio_path: str, stage: str, status: str, **fields) -> None:
+        record = {"file": audio_path, "stage": stage, "status": status, "time": time.time(), **fields}
+        with self.lock:
+            self.latest[audio_path] = record
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+
+def transcribe_stage(job: dict, manifest: Manifest, transcribe_options: dict,
+                     transcript_format: str="timestamped") -> dict:
+    manifest.record(job["audio_path"], "transcribe", "started", title=job["title"])
+    transcript = openai_handler.transcribe(audio_path=job["audio_path"], **transcribe_options)
+    if not transcript:
+        raise RuntimeError("Transcription failed")
+    manifest.record(job["audio_path"], "transcribe", "done", segments=len(transcript))
+    with tracing.span("format", transcript_format=transcript_format, segments=len(transcript)) as attributes:
+        if transcript_format in SUBTITLE_FORMATS:
+            markdown_writer.write_subtitles(transcript, transcript_format, job["output_path"])
+        job["transcript"] = transcript
+        job["markdown"] = transcript.notes(transcript_format)
+        attributes.update(characters=len(job["markdown"]))
+    return job
+
+
+def summarize_stage(job: dict, manifest: Manifest, summarize) -> dict:
+    manifest.record(job["audio_path"], "summarize", "started")
+    job["markdown"] = summarize(job["transcript"].to_text())
+    if not job["markdown"]:
+        raise RuntimeError("Summarization returned nothing")
+    manifest.record(job["audio_path"], "summarize", "done", characters=len(job["markdown"]))
+    return job
+
+
+def render_stage(job: dict, manifest: Manifest, pdf: bool=True) -> dict:
+    manifest.record(job["audio_path"], "write", "started", output=job["output_path"])
+    markdown_writer.write(job["markdown"], job["output_path"], pdf=pdf)
+    manifest.record(job["audio_path"], "write", "done", output=job["output_path"])
+
+    # Without a PDF the Markdown file is the output
+    written_path = job["output_path"] if pdf else job["output_path"].replace(".pdf", ".md")
+    manifest.record(job["audio_path"], "complete", "done", output=written_path)
+    print(f"\033[92mFinished {os.path.basename(job['audio_path'])} -> {written_path}\033[0m")
+    return job
+
+
+def run_batch(pattern: str, output_dir: str, manifest_path: str=None, transcribe_options: dict=None,
+              summarize=None, transcribe_workers: int=1, summarize_workers: int=1, render_workers: int=1,
+              queue_size: int=2, batch_api: bool=False, pdf: bool=True, transcript_format: str="timestamped") -> None:
+    inputs = collect_inputs(pattern)
+    if not inputs:
+        raise ValueError(f"No audio files found for {pattern}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+    pending = [audio_path for audio_path in inputs if not manifest.is_complete(audio_path)]
+
+    print(f"Found {len(inputs)} recordings, {len(inputs) - len(pending)} already complete, "
+          f"{len(pending)} to process.")
+    print(f"\tManifest: {manifest.path}\n")
+
+    transcribe_options = transcribe_options or {}
+    transcribe = lambda job: transcribe_stage(job, manifest, transcribe_options, transcript_format)
+
+    def on_error(job: dict, stage: str, error: Exception) -> None:
+        manifest.record(job["audio_path"], stage, "failed", error=str(error))
+        print(f"\033[91mFailed {os.path.basename(job['audio_path'])} during {stage}: {error}\033[0m")
+
+    paths = output_paths(inputs, output_dir)
+    jobs = (
+        {
+            "audio_path": audio_path,
+            "title": paths[audio_path][0],
+            "output_path": paths[audio_path][1],
+        }
+        for audio_path in pending
+    )
+
+    if batch_api:
+        finished = run_batch_api(jobs, output_dir, manifest, transcribe, on_error,
+                                 transcribe_workers, render_workers, queue_size, pdf)
+    else:
+        stages = [Stage("transcribe", transcribe, transcribe_workers)]
+        if summarize:
+            stages.append(Stage("summarize", lambda job: summarize_stage(job, manifest, summarize), summarize_workers))
+        stages.append(Stage("render", lambda job: render_stage(job, manifest, pdf), render_workers))
+
+        pipeline = Pipeline(stages, queue_size=queue_size, on_error=on_error)
+        finished = pipeline.run(jobs)
+        pipeline.report()
+
+    markdown_writer.report_rendering()
+    print(f"\nBatch finished: {len(finished)} succeeded, {len(pending) - len(finished)} failed.")
+
+
+def run_batch_api(jobs, output_dir: str, manifest: Manifest, transcribe, on_error,
+                  transcribe_workers: int, render_workers: int, queue_size: int, pdf: bool=True) -> list:
+    # Transcribe everything first, summarize it all as one Batch API submission, then render
+    transcribing = Pipeline(
+        [Stage("transcribe", transcribe, transcribe_workers)],
+        queue_size=queue_size, on_error=on_error
+    )
+    transcribed = transcribing.run(jobs)
+    transcribing.report()
+    if not transcribed:
+        return []
+
+    for job in transcribed:
+        manifest.record(job["audio_path"], "summarize", "submitted")
+
+    state_path = os.path.join(output_dir, BATCH_STATE_NAME)
+    summaries = openai_handler.summarize_batch(
+        {job["output_path"]: job["transcript"].to_text() for job in transcribed},
+        state_path
+    )
+
+    summarized = []
+    for job in transcribed:
+        if job["output_path"] in summaries:
+            job["markdown"] = summaries[job["output_path"]]
+            manifest.record(job["audio_path"], "summarize", "done", characters=len(job["markdown"]))
+            summarized.append(job)
+        else:
+            on_error(job, "summarize", RuntimeError("No result in batch output"))
+
+    rendering = Pipeline(
+        [Stage("render", lambda job: render_stage(job, manifest, pdf), render_workers)],
+        queue_size=queue_size, on_error=on_error
+    )
+    finished = rendering.run(summarized)
+    rendering.report()
+
+    os.remove(state_path)
+    return finished
@@ -0,0 +1,234 @@
+# End-to-end pipeline benchmark on synthetic recordings: normalize, transcribe (through
+# stubs/whisper_neural.py), summarize (through stubs/openai_server.py) and write notes.
+# Each stage runs in its own process so wall time, CPU time (including ffmpeg and the
+# transcriber) and peak RSS are attributed to that stage alone. With --baseline, exits
+# non-zero when a stage regresses past the tolerances.
+import os, sys, json, time, shutil, struct, math, resource, argparse, tempfile, threading, subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+STAGES = ("normalize", "transcribe", "summarize", "write")
+SAMPLE_RATE = 16000
+# (format name, ffmpeg arguments); wav16k is already in whisper-neural's input format
+FORMATS = {
+    "wav16k": None,
+    "wav44k_stereo": ["-ar", "44100", "-ac", "2", "-c:a", "pcm_s16le"],
+    "mp3": ["-ar", "44100", "-ac", "2", "-c:a", "libmp3lame", "-b:a", "128k"],
+    "m4a": ["-ar", "44100", "-ac", "2", "-c:a", "aac", "-b:a", "96k"],
+}
+EXTENSIONS = {"wav16k": ".wav", "wav44k_stereo": ".wav", "mp3": ".mp3", "m4a": ".m4a"}
+
+
+def speech_like_second(pitch: int, voiced: bool) -> bytes:
+    if not voiced:
+        return b"\0\0" * SAMPLE_RATE
+    return b"".join(
+        struct.pack("<h", int(6000 * math.sin(2 * math.pi * pitch * index / SAMPLE_RATE)
+                              * (0.6 + 0.4 * math.sin(2 * math.pi * 4 * index / SAMPLE_RATE))))
+        for index in range(SAMPLE_RATE)
+    )
+
+
+def synthesize_wav(path: str, seconds: int) -> None:
+    # Three "voices" and a pause, built once and tiled so hour-long fixtures stay cheap to make
+    import wave
+    pattern = [speech_like_second(120, True), speech_like_second(160, True), speech_like_second(200, True),
+               speech_like_second(0, False)]
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for second in range(seconds):
+            wav.writeframes(pattern[second % len(pattern)])
+
+
+def make_fixture(fixture_dir: str, seconds: int, audio_format: str):
+    path = os.path.join(fixture_dir, f"speech_{seconds}s_{audio_format}{EXTENSIONS[audio_format]}")
+    if os.path.exists(path):
+        return path
+
+    base_path = os.path.join(fixture_dir, f"speech_{seconds}s_wav16k.wav")
+    if not os.path.exists(base_path):
+        synthesize_wav(base_path, seconds)
+    if FORMATS[audio_format] is None:
+        return base_path
+
+    ffmpeg_path = shutil.which("ffmpeg")
+    if not ffmpeg_path:
+        return None
+    subprocess.run([ffmpeg_path, "-nostdin", "-v", "error", "-y", "-i", base_path, *FORMATS[audio_format], path],
+                   check=True)
+    return path
+
+
+def peak_rss_mb(usage) -> float:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_stage(stage: str, input_path: str, output_path: str, workers: int, pdf: bool) -> None:
+    # Child side: do one stage, then report this process's (and its children's) resource use
+    start_time = time.perf_counter()
+
+    if stage == "normalize":
+        from asi_whisper import whisper_coreML
+        normalized_path, audio_len = whisper_coreML.audio_normalizer(input_path)
+        shutil.copy(normalized_path, output_path)
+        result = {"audio_seconds": audio_len}
+    elif stage == "transcribe":
+        import openai_handler
+        transcript = openai_handler.transcribe(input_path, workers=workers, use_cache=False, use_daemon=False,
+                                               backend="whisper.cpp")
+        if not transcript:
+            raise RuntimeError("Transcription came back empty")
+        with open(output_path, 'w') as file:
+            file.write(transcript.to_text())
+        result = {"segments": len(transcript)}
+    elif stage == "summarize":
+        import openai_handler
+        with open(input_path) as file:
+            summary = openai_handler.summarize(file.read())
+        with open(output_path, 'w') as file:
+            file.write(summary)
+        result = {"characters": len(summary)}
+    else:
+        import markdown_writer
+        with open(input_path) as file:
+            markdown_writer.write(file.read(), output_path, pdf=pdf)
+        result = {"pdf": pdf}
+
+    wall_seconds = time.perf_counter() - start_time
+    own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    result.update({
+        "wall_seconds": round(wall_seconds, 4),
+        "cpu_seconds": round(own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime, 4),
+        "peak_rss_mb": round(max(peak_rss_mb(own), peak_rss_mb(children)), 1),
+    })
+    print("BENCH_RESULT " + json.dumps(result))
+
+
+def measure_stage(stage: str, input_path: str, output_path: str, environment: dict, workers: int,
+                  pdf: bool) -> dict:
+    command = [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--stage-input", input_path,
+               "--stage-output", output_path, "--workers", str(workers)]
+    if pdf:
+        command.append("--pdf")
+    result = subprocess.run(command, cwd=REPO_ROOT, env=environment, capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            return json.loads(line[len("BENCH_RESULT "):])
+    raise RuntimeError(f"{stage} failed:\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+
+
+def run_fixture(fixture_path: str, work_dir: str, environment: dict, workers: int, pdf: bool, repeats: int) -> dict:
+    name = os.path.splitext(os.path.basename(fixture_path))[0]
+    paths = {
+        "normalize": (fixture_path, os.path.join(work_dir, f"{name}_normalized.wav")),
+        "transcribe": (os.path.join(work_dir, f"{name}_normalized.wav"), os.path.join(work_dir, f"{name}.txt")),
+        "summarize": (os.path.join(work_dir, f"{name}.txt"), os.path.join(work_dir, f"{name}_summary.md")),
+        "write": (os.path.join(work_dir, f"{name}_summary.md"), os.path.join(work_dir, f"{name}.pdf")),
+    }
+
+    stages = {}
+    for stage in STAGES:
+        runs = []
+        for _ in range(repeats):
+            # Normalized audio and summaries are cached by content; clear them so every run pays for the work
+            for cache_name in ("normalized", "summaries"):
+                shutil.rmtree(os.path.join(environment["NOTETAKER_CACHE_DIR"], cache_name), ignore_errors=True)
+            runs.append(measure_stage(stage, *paths[stage], environment, workers, pdf))
+        stages[stage] = min(runs, key=lambda run: run["wall_seconds"])
+    return {"name": name, "stages": stages}
+
+
+def compare(report: dict, baseline: dict, time_tolerance: float, rss_tolerance: float) -> list:
+    baseline_stages = {fixture["name"]: fixture["stages"] for fixture in baseline.get("fixtures", [])}
+    regressions = []
+    for fixture in report["fixtures"]:
+        for stage, current in fixture["stages"].items():
+            previous = baseline_stages.get(fixture["name"], {}).get(stage)
+            if not previous:
+                continue
+            for metric, tolerance in (("wall_seconds", time_tolerance), ("cpu_seconds", time_tolerance),
+                                      ("peak_rss_mb", rss_tolerance)):
+                # Small absolute slack keeps sub-100 ms stages from flapping on noise
+                limit = previous[metric] * (1 + tolerance) + (0.05 if metric != "peak_rss_mb" else 5)
+                if current[metric] > limit:
+                    regressions.append({
+                        "fixture": fixture["name"], "stage": stage, "metric": metric,
+                        "baseline": previous[metric], "current": current[metric], "limit": round(limit, 4),
+                    })
+    return regressions
+
+
+def start_stub_llm(latency: float):
+    from stubs.openai_server import serve
+    server = serve(port=0, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the notetaker pipeline end to end on synthetic audio.")
+    parser.add_argument("--durations", type=int, nargs="+", default=[60, 600], help="Fixture lengths in seconds (default = 60 600).")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=["wav16k", "mp3"])
+    parser.add_argument("--workers", type=int, default=1, help="Transcription workers (default = 1).")
+    parser.add_argument("--repeats", type=int, default=1, help="Runs per stage, the fastest is reported (default = 1).")
+    parser.add_argument("--whisper-rtf", type=float, default=0.01, help="Seconds the fake whisper-neural spends per second of audio.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds the stub LLM waits per request.")
+    parser.add_argument("--pdf", action="store_true", help="Also render PDFs in the write stage.")
+    parser.add_argument("--fixture-dir", default=os.path.join(tempfile.gettempdir(), "notetaker_bench_fixtures"))
+    parser.add_argument("--baseline", help="Compare against this earlier report and exit 1 on regressions.")
+    parser.add_argument("--save-baseline", help="Write this run's report here for later comparisons.")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed fractional wall/CPU growth (default = 0.25).")
+    parser.add_argument("--rss-tolerance", type=float, default=0.15, help="Allowed fractional peak RSS growth (default = 0.15).")
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--stage-input", help=argparse.SUPPRESS)
+    parser.add_argument("--stage-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage, args.stage_input, args.stage_output, args.workers, args.pdf)
+        sys.exit(0)
+
+    os.makedirs(args.fixture_dir, exist_ok=True)
+    server = start_stub_llm(args.llm_latency)
+
+    with tempfile.TemporaryDirectory(prefix="notetaker_bench_") as work_dir:
+        environment = {
+            **os.environ,
+            "WHISPER_NEURAL_BIN": os.path.join(REPO_ROOT, "stubs", "whisper_neural.py"),
+            "WHISPER_STUB_RTF": str(args.whisper_rtf),
+            "OPENAI_SECRET": "stub",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1",
+            "NOTETAKER_CACHE_DIR": os.path.join(work_dir, "cache"),
+        }
+
+        fixtures, skipped = [], []
+        for seconds in args.durations:
+            for audio_format in args.formats:
+                fixture_path = make_fixture(args.fixture_dir, seconds, audio_format)
+                if fixture_path is None:
+                    skipped.append({"fixture": f"speech_{seconds}s_{audio_format}", "reason": "ffmpeg not found"})
+                    continue
+                print(f"Benchmarking {os.path.basename(fixture_path)}...", file=sys.stderr)
+                fixtures.append(run_fixture(fixture_path, work_dir, environment, args.workers, args.pdf, args.repeats))
+
+    server.shutdown()
+
+    report = {
+        "settings": {key: getattr(args, key) for key in ("workers", "repeats", "whisper_rtf", "llm_latency", "pdf")},
+        "fixtures": fixtures,
+        "skipped": skipped,
+    }
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["regressions"] = compare(report, json.load(file), args.time_tolerance, args.rss_tolerance)
+        report["passed"] = not report["regressions"]
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report.get("passed", True) else 1)
@@ -0,0 +1,97 @@
+# Measures how well TranscriptCommitter collapses overlapping whisper-neural-rtt windows.
+# Synthetic corpora have a known reference, so word accuracy is checked against it;
+# a real capture only reports the compression ratio. Exits non-zero below the thresholds.
+import os, sys, json, time, random, difflib, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asi_whisper.transcript_committer import TranscriptCommitter, normalize_token
+from asi_whisper.realtime_transcription import StreamParser, READ_CHUNK_BYTES
+from bench_rtt_parser import WORDS
+
+# (name, words per window, words per finalized line step, chance a window edge word is misheard)
+CORPORA = [
+    ("clean", 25, 5, 0.0),
+    ("edge_noise", 25, 5, 0.15),
+    ("long_window", 40, 4, 0.1),
+    ("short_window", 12, 6, 0.1),
+]
+
+
+def synthesize_windows(reference: list, window_words: int, step_words: int, noise: float, seed: int=0) -> list:
+    rng = random.Random(seed)
+    lines = []
+    for end in range(step_words, len(reference) + step_words, step_words):
+        end = min(end, len(reference))
+        window = list(reference[max(0, end - window_words):end])
+        # Whisper tends to clip or mishear the words at the edges of a window
+        if noise and len(window) > 2 and rng.random() < noise:
+            window.pop(0)
+        if noise and window and rng.random() < noise:
+            window[-1] = rng.choice(WORDS)
+        lines.append(" ".join(window))
+    return lines
+
+
+def word_accuracy(reference: list, hypothesis: list) -> float:
+    reference = [normalize_token(word) for word in reference]
+    hypothesis = [normalize_token(word) for word in hypothesis]
+    matcher = difflib.SequenceMatcher(a=reference, b=hypothesis, autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    return matched / max(len(reference), len(hypothesis))
+
+
+def run_lines(lines: list) -> (TranscriptCommitter, float):
+    committer = TranscriptCommitter()
+    start_time = time.perf_counter()
+    for line in lines:
+        committer.commit(line)
+    return committer, time.perf_counter() - start_time
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check compression and word accuracy of realtime window deduplication.")
+    parser.add_argument("capture", nargs='?', help="Raw whisper-neural-rtt stdout capture to replay as well.")
+    parser.add_argument("--words", type=int, default=5000, help="Reference length of each synthetic corpus (default = 5000).")
+    parser.add_argument("--min-compression", type=float, default=0.95,
+                        help="Minimum fraction of the ideal compression ratio (raw words / reference words).")
+    parser.add_argument("--min-accuracy", type=float, default=0.9)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    reference = [rng.choice(WORDS) + ("." if rng.random() < 0.08 else "") for _ in range(args.words)]
+
+    report, failed = {}, False
+    for name, window_words, step_words, noise in CORPORA:
+        lines = synthesize_windows(reference, window_words, step_words, noise)
+        committer, elapsed = run_lines(lines)
+        raw_words = sum(len(line.split()) for line in lines)
+        result = {
+            "lines": len(lines),
+            "compression_ratio": raw_words / max(1, len(committer.words)),
+            "ideal_compression_ratio": raw_words / len(reference),
+            "word_accuracy": word_accuracy(reference, committer.words),
+            "microseconds_per_line": elapsed / len(lines) * 1e6,
+        }
+        result["passed"] = (result["compression_ratio"] >= args.min_compression * result["ideal_compression_ratio"]
+                            and result["word_accuracy"] >= args.min_accuracy)
+        failed = failed or not result["passed"]
+        report[name] = result
+
+    if args.capture:
+        with open(args.capture, 'rb') as capture_file:
+            data = capture_file.read()
+        stream_parser = StreamParser()
+        lines = []
+        for offset in range(0, len(data), READ_CHUNK_BYTES):
+            lines.extend(stream_parser.feed(data[offset:offset + READ_CHUNK_BYTES]))
+        lines.extend(stream_parser.finish())
+        committer, elapsed = run_lines(lines)
+        report["capture"] = {
+            "lines": len(lines),
+            "compression_ratio": sum(len(line.split()) for line in lines) / max(1, len(committer.words)),
+            "microseconds_per_line": elapsed / max(1, len(lines)) * 1e6,
+        }
+
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,151 @@
+# Replays a captured whisper-neural-rtt stdout stream through the byte-at-a-time
+# reader that run_stream used to have and through StreamParser, and compares them.
+# Record a capture with: python main.py rt --capture-rtt capture.bin
+import os, sys, io, time, json, codecs, random, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asi_whisper.realtime_transcription import (
+    StreamParser, READ_CHUNK_BYTES, FRAME_RATE,
+    strip_ansi_escape_sequences, remove_unwanted_characters, remove_unwanted_phrases
+)
+
+WORDS = ("the gradient of the loss with respect to each weight is computed by backpropagation "
+         "and then the optimizer takes a step in the opposite direction scaled by the learning rate").split()
+
+
+def synthesize_capture(seconds: int, step_ms: int=1000, length_ms: int=10000, words_per_second: float=2.5) -> bytes:
+    # Mimics whisper-neural-rtt: every step repaints the current window, every
+    # length/step steps the window is finalized with a newline
+    steps_per_line = max(1, length_ms // step_ms - 1)
+    rng = random.Random(0)
+    words = [rng.choice(WORDS) for _ in range(int(seconds * words_per_second) + 1)]
+    output = io.BytesIO()
+    line_start = 0
+
+    for step in range(1, seconds * 1000 // step_ms + 1):
+        heard = int(step * step_ms / 1000 * words_per_second)
+        output.write(b"\x1b[2K\r" + " ".join(words[line_start:heard]).encode("utf-8"))
+        if step % steps_per_line == 0:
+            output.write(b"\n")
+            line_start = heard
+    return output.getvalue()
+
+
+def legacy_parse(data: bytes, sink) -> list:
+    # The byte-at-a-time loop run_stream used before StreamParser
+    stream = io.BytesIO(data)
+    full_transcription = []
+    current_line = []
+    cursor_position = 0
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    in_escape_sequence = False
+
+    while True:
+        byte = stream.read(1)
+        if not byte:
+            break
+        try:
+            char = decoder.decode(byte, final=False)
+        except UnicodeDecodeError:
+            continue
+        if not char:
+            continue
+        c = char
+        sink.write(c)
+        sink.flush()
+
+        if in_escape_sequence:
+            if '@' <= c <= '~':
+                in_escape_sequence = False
+            continue
+        if c == '\x1b':
+            in_escape_sequence = True
+            continue
+        if c == '\r':
+            cursor_position = 0
+            continue
+        if c == '\n':
+            line_text = ''.join(current_line).strip()
+            if line_text:
+                line_text = strip_ansi_escape_sequences(line_text)
+                line_text = remove_unwanted_characters(line_text)
+                if line_text:
+                    full_transcription.append(line_text)
+            current_line.clear()
+            cursor_position = 0
+            continue
+        if cursor_position < len(current_line):
+            current_line[cursor_position] = c
+        else:
+            current_line.append(c)
+        cursor_position += 1
+
+    if current_line:
+        line_text = remove_unwanted_characters(strip_ansi_escape_sequences(''.join(current_line).strip()))
+        if line_text:
+            full_transcription.append(line_text)
+    return [remove_unwanted_phrases(' '.join(full_transcription))]
+
+
+def buffered_parse(data: bytes, sink) -> list:
+    parser = StreamParser()
+    lines = []
+    pending_output = []
+    frame_interval = 1 / FRAME_RATE
+    last_paint = time.monotonic()
+
+    for offset in range(0, len(data), READ_CHUNK_BYTES):
+        chunk = data[offset:offset + READ_CHUNK_BYTES]
+        pending_output.append(chunk)
+        lines.extend(parser.feed(chunk))
+        if time.monotonic() - last_paint >= frame_interval:
+            sink.write(b''.join(pending_output))
+            sink.flush()
+            pending_output.clear()
+            last_paint = time.monotonic()
+    sink.write(b''.join(pending_output))
+    sink.flush()
+    lines.extend(parser.finish())
+    return [' '.join(lines)]
+
+
+def measure(function, data: bytes, sink, repeats: int) -> dict:
+    wall_times, cpu_times = [], []
+    for _ in range(repeats):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = function(data, sink)
+        wall_times.append(time.perf_counter() - wall_start)
+        cpu_times.append(time.process_time() - cpu_start)
+    wall, cpu = min(wall_times), min(cpu_times)
+    return {
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "bytes_per_second": len(data) / wall if wall else float("inf"),
+        "transcript_characters": len(result[0]),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the realtime stream parser against the legacy byte-at-a-time reader.")
+    parser.add_argument("capture", nargs='?', help="Raw whisper-neural-rtt stdout capture (default = synthesized stream).")
+    parser.add_argument("--seconds", type=int, default=1800, help="Length of the synthesized stream (default = 1800).")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.capture:
+        with open(args.capture, 'rb') as capture_file:
+            data = capture_file.read()
+    else:
+        data = synthesize_capture(args.seconds)
+
+    with open(os.devnull, 'w') as text_sink, open(os.devnull, 'wb') as byte_sink:
+        legacy = measure(legacy_parse, data, text_sink, args.repeats)
+        buffered = measure(buffered_parse, data, byte_sink, args.repeats)
+
+    print(json.dumps({
+        "capture_bytes": len(data),
+        "legacy": legacy,
+        "buffered": buffered,
+        "cpu_speedup": legacy["cpu_seconds"] / buffered["cpu_seconds"] if buffered["cpu_seconds"] else None,
+    }, indent=2))
@@ -0,0 +1,75 @@
+# Checks how quickly the CLI gets to its first prompt and which imports it pays for.
+# Exits non-zero when the prompt takes longer than the budget or a backend SDK is
+# imported before any backend has been selected.
+import os, sys, time, json, select, argparse, subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"Please enter a title"
+HEAVY_MODULES = ("torch", "whisper", "openai", "ollama", "pdfkit", "markdown2", "tiktoken", "idlelib")
+
+
+def import_profile(module: str="main") -> dict:
+    # python -X importtime reports "self | cumulative | name" in microseconds on stderr
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        imports.append((name, int(self_us), int(cumulative_us)))
+
+    return {
+        "total_seconds": sum(self_us for _, self_us, _ in imports) / 1e6,
+        "slowest": [
+            {"module": name.strip(), "cumulative_seconds": cumulative_us / 1e6}
+            for name, _, cumulative_us in sorted(imports, key=lambda item: -item[2])[:10]
+        ],
+        "heavy_modules_loaded": sorted({
+            name.split(".")[0] for name, _, _ in imports if name.split(".")[0] in HEAVY_MODULES
+        }),
+    }
+
+
+def time_to_prompt(timeout: float=30.0) -> float:
+    start_time = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-u", "main.py", "startup_benchmark.wav", "--no-daemon"],
+        cwd=REPO_ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    output = b""
+    try:
+        while PROMPT not in output:
+            remaining = timeout - (time.perf_counter() - start_time)
+            if remaining <= 0:
+                raise TimeoutError(f"No prompt after {timeout}s")
+            ready, _, _ = select.select([proc.stdout], [], [], remaining)
+            if ready:
+                data = os.read(proc.stdout.fileno(), 4096)
+                if not data:
+                    raise RuntimeError(f"CLI exited before prompting: {output.decode(errors='replace')}")
+                output += data
+        return time.perf_counter() - start_time
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure CLI startup time against a budget.")
+    parser.add_argument("--budget", type=float, default=0.5, help="Maximum seconds until the title prompt (default = 0.5).")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    prompt_seconds = min(time_to_prompt() for _ in range(args.repeats))
+    imports = import_profile()
+    report = {
+        "time_to_prompt_seconds": prompt_seconds,
+        "budget_seconds": args.budget,
+        "passed": prompt_seconds <= args.budget and not imports["heavy_modules_loaded"],
+        "imports": imports,
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["passed"] else 1)
@@ -0,0 +1,107 @@
+# Checks the local summarization path against stubs/ollama_server.py: no request may be
+# truncated by the server's context window, the model must be loaded once per context size
+# (not once per request or per run), and split transcripts must use the configured parallelism.
+# Exits non-zero when any case fails.
+import os, sys, json, time, random, argparse, threading, subprocess, urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+WORDS = ("gradient", "descent", "converges", "when", "the", "learning", "rate", "is", "small", "enough", "and",
+         "loss", "surface", "convex", "matrix", "eigenvalue", "kernel", "we", "derive", "bound", "proof")
+
+
+def synthesize_transcript(tokens: int, seed: int=0) -> str:
+    # whisper.cpp style lines, counted with the same tokenizer the handler uses
+    from text_chunker import count_tokens
+    rng = random.Random(seed)
+    lines, counted = [], 0
+    while counted < tokens:
+        second = len(lines) * 5
+        text = " ".join(rng.choice(WORDS) for _ in range(14)) + "."
+        lines.append(f"[{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}.000 --> "
+                     f"{(second + 5) // 3600:02d}:{(second + 5) // 60 % 60:02d}:{(second + 5) % 60:02d}.000]   {text}")
+        counted += count_tokens(lines[-1]) + 1
+    return "\n".join(lines)
+
+
+def run_case(tokens: int, parallel: int, model: str) -> None:
+    # Child side: one CLI-like run, so nothing is shared with earlier cases but the server
+    import ollama_handler
+    ollama_handler.configure(model, parallel)
+    start_time = time.perf_counter()
+    summary = ollama_handler.summarize(synthesize_transcript(tokens))
+    print("CHECK_RESULT " + json.dumps({"seconds": round(time.perf_counter() - start_time, 3),
+                                        "characters": len(summary)}))
+
+
+def stub_counters(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/api/ps") as response:
+        return json.load(response)["stub"]
+
+
+def measure_case(name: str, tokens: int, parallel: int, model: str, url: str, environment: dict) -> dict:
+    before = stub_counters(url)
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", str(tokens), "--parallel", str(parallel),
+               "--model", model]
+    result = subprocess.run(command, cwd=REPO_ROOT, env=environment, capture_output=True, text=True)
+    after = stub_counters(url)
+    for line in result.stdout.splitlines():
+        if line.startswith("CHECK_RESULT "):
+            return {
+                "case": name, "transcript_tokens": tokens, "parallel": parallel, "model": model,
+                **json.loads(line[len("CHECK_RESULT "):]),
+                **{key: after[key] - before[key] for key in ("loads", "requests", "truncated_requests")},
+                "max_concurrent": after["max_concurrent"],
+            }
+    raise RuntimeError(f"{name} failed:\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check the Ollama summarization path against a stub server.")
+    parser.add_argument("--model", default="llama3.1:8b-instruct-q4_K_M")
+    parser.add_argument("--parallel", type=int, default=4, help="Server slots and client parallelism (default = 4).")
+    parser.add_argument("--max-context", type=int, default=8192, help="OLLAMA_MAX_CONTEXT for the runs (default = 8192).")
+    parser.add_argument("--load-seconds", type=float, default=1.0, help="Seconds the stub takes to load a model.")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Seconds per generated token.")
+    parser.add_argument("--run-case", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args.run_case, args.parallel, args.model)
+        sys.exit(0)
+
+    from stubs.ollama_server import serve
+    server = serve(port=0, load_seconds=args.load_seconds, token_delay=args.token_delay,
+                   num_parallel=args.parallel)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    environment = {**os.environ, "LLAMA_URL": url, "OLLAMA_MAX_CONTEXT": str(args.max_context)}
+
+    # (name, transcript tokens, parallelism, loads allowed)
+    cases = [
+        ("short_cold", 1500, 1, 1),
+        ("short_warm", 1500, 1, 0),
+        ("long_serial", 60000, 1, 1),
+        ("long_parallel", 60000, args.parallel, 0),
+    ]
+    results, failures = [], []
+    for name, tokens, parallel, allowed_loads in cases:
+        print(f"Running {name}...", file=sys.stderr)
+        result = measure_case(name, tokens, parallel, args.model, url, environment)
+        results.append(result)
+        if result["truncated_requests"] or result["loads"] > allowed_loads or not result["characters"]:
+            failures.append(name)
+    server.shutdown()
+
+    serial, parallel = results[2], results[3]
+    if args.parallel > 1 and parallel["max_concurrent"] < 2:
+        failures.append("long_parallel")
+
+    print(json.dumps({
+        "results": results,
+        "parallel_speedup": round(serial["seconds"] / parallel["seconds"], 2),
+        "failures": failures,
+        "passed": not failures,
+    }, indent=2))
+    sys.exit(0 if not failures else 1)
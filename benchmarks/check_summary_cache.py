@@ -0,0 +1,88 @@
+# Checks the chunk-level summary cache against stubs/openai_server.py: summarizes a long
+# synthetic transcript, then re-runs it unchanged, with a few words fixed mid-transcript,
+# with a sentence inserted near the start (which shifts every fixed-size chunk boundary)
+# and with a changed system prompt. Only chunks touched by an edit may call the LLM again.
+# Exits non-zero when any run misses more than allowed.
+import os, sys, json, random, argparse, tempfile, threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+WORDS = ("the", "gradient", "of", "loss", "with", "respect", "to", "weights", "is", "computed", "by",
+         "backpropagation", "and", "then", "we", "update", "each", "parameter", "using", "a", "small", "step")
+
+
+def synthesize_transcript(sentences: int, seed: int=0) -> str:
+    rng = random.Random(seed)
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def fix_words(transcript: str) -> str:
+    # A couple of corrected words in one sentence in the middle
+    sentences = transcript.split(". ")
+    middle = len(sentences) // 2
+    sentences[middle] = sentences[middle].replace("gradient", "Jacobian", 1) + " indeed"
+    return ". ".join(sentences)
+
+
+def insert_sentence(transcript: str) -> str:
+    sentences = transcript.split(". ")
+    sentences.insert(3, "As mentioned last week the exam covers everything up to this lecture")
+    return ". ".join(sentences)
+
+
+def summarize_run(openai_handler, summary_cache, transcript: str) -> dict:
+    before = dict(summary_cache.stats)
+    chunks = len(openai_handler.chunk_content_defined(transcript, openai_handler.CHUNK_TOKENS,
+                                                      openai_handler.CHUNK_OVERLAP_TOKENS))
+    openai_handler.summarize(transcript)
+    return {
+        "chunks": chunks,
+        **{key: summary_cache.stats[key] - before[key] for key in ("hits", "misses", "tokens_saved")},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check that edited transcripts only re-summarize changed chunks.")
+    parser.add_argument("--sentences", type=int, default=6000, help="Sentences in the synthetic transcript (default = 6000).")
+    parser.add_argument("--max-edit-misses", type=int, default=4, help="LLM calls allowed after a small edit, including merges (default = 4).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="notetaker_summary_cache_") as cache_dir:
+        # The stub has no quotas, so skip the client-side rate limits too
+        os.environ.update({"NOTETAKER_CACHE_DIR": cache_dir, "OPENAI_SECRET": "stub", "OPENAI_RPM": "0",
+                           "OPENAI_TPM": "0"})
+        from stubs.openai_server import serve
+        server = serve(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+        import openai_handler, summary_cache
+
+        transcript = synthesize_transcript(args.sentences)
+        runs = {
+            "first": summarize_run(openai_handler, summary_cache, transcript),
+            "unchanged": summarize_run(openai_handler, summary_cache, transcript),
+            "fixed_words": summarize_run(openai_handler, summary_cache, fix_words(transcript)),
+            "inserted_sentence": summarize_run(openai_handler, summary_cache, insert_sentence(transcript)),
+        }
+        openai_handler.CHUNK_SYSTEM_PROMPT += "Prefer bullet points. "
+        runs["changed_prompt"] = summarize_run(openai_handler, summary_cache, transcript)
+        server.shutdown()
+
+    failures = []
+    if runs["first"]["hits"]:
+        failures.append("first")
+    if runs["unchanged"]["misses"]:
+        failures.append("unchanged")
+    for name in ("fixed_words", "inserted_sentence"):
+        if runs[name]["misses"] > args.max_edit_misses or not runs[name]["hits"]:
+            failures.append(name)
+    if runs["changed_prompt"]["hits"] > runs["changed_prompt"]["chunks"] // 2:
+        failures.append("changed_prompt")
+
+    print(json.dumps({"runs": runs, "failures": failures, "passed": not failures}, indent=2))
+    sys.exit(0 if not failures else 1)
@@ -0,0 +1,148 @@
+# Checks asi_whisper.vad on synthetic recordings with known speech intervals: every labelled
+# speech millisecond must survive compaction (recall), long silences should be skipped, and
+# timestamps on the compacted audio must map back to where they were in the original.
+# Exits non-zero when any corpus misses a threshold.
+import os, sys, json, wave, random, argparse, tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asi_whisper import vad
+
+SAMPLE_RATE = 16000
+
+# (name, speaker level dBFS, background noise dBFS or None, mains hum, pause lengths in seconds)
+CORPORA = [
+    ("clean_lecture", -20, None, False, (0.3, 0.8, 2.0, 6.0, 20.0)),
+    ("hissy_room", -22, -50, False, (0.4, 1.5, 4.0, 12.0)),
+    ("hum_and_hiss", -24, -48, True, (0.5, 3.0, 8.0)),
+    ("quiet_speaker", -34, -58, False, (0.5, 2.0, 10.0)),
+    ("meeting_pauses", -20, -55, False, (1.0, 1.2, 30.0, 45.0)),
+]
+
+
+def decibels_to_amplitude(level_dbfs: float) -> float:
+    return 10 ** (level_dbfs / 20) * np.sqrt(2)
+
+
+def voiced(seconds: float, level_dbfs: float, rng) -> np.ndarray:
+    # Harmonics of a wandering pitch, amplitude-modulated at syllable rate
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = rng.uniform(90, 220) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.2, 1.0) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    wave_form = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 6))
+    envelope = 0.55 + 0.45 * np.sin(2 * np.pi * rng.uniform(3, 6) * t)
+    signal = wave_form * envelope
+    return signal / np.sqrt(np.mean(signal ** 2)) * decibels_to_amplitude(level_dbfs) / np.sqrt(2)
+
+
+def fricative(seconds: float, level_dbfs: float, rng) -> np.ndarray:
+    # "s"/"f"-like: high-passed noise, much quieter than the vowels around it
+    noise = rng.standard_normal(int(seconds * SAMPLE_RATE))
+    noise = np.diff(noise, prepend=0.0)
+    return noise / np.sqrt(np.mean(noise ** 2)) * decibels_to_amplitude(level_dbfs) / np.sqrt(2)
+
+
+def synthesize(path: str, level_dbfs: float, noise_dbfs, hum: bool, pauses: tuple, seed: int) -> list:
+    # Returns the labelled speech intervals [(start_ms, end_ms)]
+    rng = np.random.default_rng(seed)
+    pieces, labels, position = [], [], 0
+    for pause in list(pauses) * 2:
+        utterance = []
+        for _ in range(rng.integers(2, 6)):
+            utterance.append(voiced(rng.uniform(0.2, 1.5), level_dbfs, rng))
+            if rng.random() < 0.4:
+                utterance.append(fricative(rng.uniform(0.08, 0.2), level_dbfs - 14, rng))
+        utterance = np.concatenate(utterance)
+        labels.append((position * 1000 // SAMPLE_RATE, (position + len(utterance)) * 1000 // SAMPLE_RATE))
+        pieces += [utterance, np.zeros(int(pause * SAMPLE_RATE))]
+        position += len(utterance) + int(pause * SAMPLE_RATE)
+
+    signal = np.concatenate(pieces)
+    if noise_dbfs is not None:
+        signal += rng.standard_normal(len(signal)) * decibels_to_amplitude(noise_dbfs) / np.sqrt(2)
+    if hum:
+        signal += decibels_to_amplitude(-45) * np.sin(2 * np.pi * 60 * np.arange(len(signal)) / SAMPLE_RATE)
+
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes())
+    return labels
+
+
+def covered_ms(intervals: list, regions: list) -> int:
+    covered = 0
+    for start_ms, end_ms in intervals:
+        for region_start, region_end in regions:
+            covered += max(0, min(end_ms, region_end) - max(start_ms, region_start))
+    return covered
+
+
+def to_compact(ms: int, offset_map: list):
+    for compact_start, original_start, duration in offset_map:
+        if original_start <= ms < original_start + duration:
+            return compact_start + ms - original_start
+    return None
+
+
+def check_corpus(corpus: tuple, directory: str, seed: int, margin_db: float, min_silence_ms: int) -> dict:
+    name, level_dbfs, noise_dbfs, hum, pauses = corpus
+    path = os.path.join(directory, f"{name}.wav")
+    labels = synthesize(path, level_dbfs, noise_dbfs, hum, pauses, seed)
+    with wave.open(path, 'rb') as wav:
+        total_ms = wav.getnframes() * 1000 // SAMPLE_RATE
+
+    regions = vad.detect_speech(path, margin_db=margin_db, min_silence_ms=min_silence_ms)
+    offset_map = vad.compact(path, regions, os.path.join(directory, f"{name}.speech.wav"))
+
+    speech_ms = sum(end_ms - start_ms for start_ms, end_ms in labels)
+    # Silence that the settings allow to be dropped: gaps of at least min_silence_ms
+    gaps = [(labels[index][1], labels[index + 1][0]) for index in range(len(labels) - 1)]
+    gaps.append((labels[-1][1], total_ms))
+    droppable_ms = sum(end - start for start, end in gaps if end - start >= min_silence_ms)
+    kept_ms = sum(end_ms - start_ms for start_ms, end_ms in regions)
+
+    rng = random.Random(seed)
+    probes = [rng.randrange(start_ms, end_ms) for start_ms, end_ms in labels for _ in range(20)]
+    remap_errors = [
+        abs(vad.remap(compact_ms, offset_map) - probe)
+        for probe in probes
+        if (compact_ms := to_compact(probe, offset_map)) is not None
+    ]
+
+    return {
+        "corpus": name,
+        "duration_seconds": total_ms / 1000,
+        "speech_recall": covered_ms(labels, regions) / speech_ms,
+        "skipped_seconds": (total_ms - kept_ms) / 1000,
+        "droppable_silence_skipped": (total_ms - kept_ms) / droppable_ms if droppable_ms else 1.0,
+        "regions": len(regions),
+        "max_remap_error_ms": max(remap_errors) if remap_errors else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check that voice activity detection never drops speech.")
+    parser.add_argument("--seeds", type=int, default=3, help="Recordings generated per corpus (default = 3).")
+    parser.add_argument("--margin-db", type=float, default=vad.THRESHOLD_MARGIN_DB)
+    parser.add_argument("--min-silence", type=int, default=vad.MIN_SILENCE_MS)
+    parser.add_argument("--min-recall", type=float, default=1.0, help="Required fraction of speech kept (default = 1.0).")
+    parser.add_argument("--min-skipped", type=float, default=0.6, help="Required fraction of long silences skipped (default = 0.6).")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="notetaker_vad_") as directory:
+        for corpus in CORPORA:
+            for seed in range(args.seeds):
+                results.append(check_corpus(corpus, directory, seed, args.margin_db, args.min_silence))
+
+    failures = [
+        result for result in results
+        if result["speech_recall"] < args.min_recall
+        or result["droppable_silence_skipped"] < args.min_skipped
+        or (result["max_remap_error_ms"] or 0) > 1
+    ]
+    print(json.dumps({"results": results, "failures": len(failures), "passed": not failures}, indent=2))
+    sys.exit(0 if not failures else 1)
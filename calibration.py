@@ -0,0 +1,187 @@
+import os, json, time, math, wave, struct, shutil, platform, tempfile, importlib.util
+from disk_cache import CACHE_ROOT
+import backends
+
+PROFILE_PATH = os.path.join(CACHE_ROOT, "calibration.json")
+SHORT_CLIP_SECONDS = 10
+LONG_CLIP_SECONDS = 60
+LOCAL_BACKENDS = ("whisper.cpp", "openai-whisper")
+SAMPLE_RATE = 16000
+
+
+def host_key() -> str:
+    return f"{platform.node()}-{platform.machine()}-{os.cpu_count()}"
+
+
+def load_profile() -> dict:
+    try:
+        with open(PROFILE_PATH) as file:
+            return json.load(file).get(host_key(), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(profile: dict) -> None:
+    try:
+        with open(PROFILE_PATH) as file:
+            profiles = json.load(file)
+    except (OSError, ValueError):
+        profiles = {}
+    profiles[host_key()] = profile
+
+    os.makedirs(os.path.dirname(PROFILE_PATH), exist_ok=True)
+    temp_path = PROFILE_PATH + ".tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(profiles, file, indent=2)
+    os.replace(temp_path, PROFILE_PATH)
+
+
+def predict(backend: str, audio_seconds: float, profile: dict=None):
+    # Expected wall time = fixed overhead (model load, upload latency) + RTF x audio length
+    measurement = (profile if profile is not None else load_profile()).get("backends", {}).get(backend)
+    if not measurement or audio_seconds is None:
+        return None
+    return measurement["overhead"] + measurement["rtf"] * audio_seconds
+
+
+def fastest(candidates, audio_seconds: float=None):
+    measured = load_profile().get("backends", {})
+    available = [backend for backend in candidates if backend in measured]
+    if not available:
+        return None
+    if audio_seconds is None:
+        return min(available, key=lambda backend: measured[backend]["rtf"])
+    return min(available, key=lambda backend: measured[backend]["overhead"] + measured[backend]["rtf"] * audio_seconds)
+
+
+def available_backends() -> list:
+    from asi_whisper import whisper_coreML
+
+    available = []
+    binary_path, model_path = whisper_coreML.get_paths()
+    if os.access(binary_path, os.X_OK) and os.path.exists(model_path):
+        available.append("whisper.cpp")
+    if importlib.util.find_spec("whisper") and importlib.util.find_spec("torch"):
+        available.append("openai-whisper")
+    if os.getenv("OPENAI_SECRET"):
+        available.append("openai-cloud")
+    return available
+
+
+def synthesize_clip(path: str, seconds: int) -> None:
+    # Voiced-like bursts separated by pauses; only used when no reference recording is given
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for second in range(seconds):
+            if second % 4 == 3:
+                wav.writeframes(b"\0\0" * SAMPLE_RATE)
+                continue
+            pitch = 120 + 40 * (second % 3)
+            wav.writeframes(b"".join(
+                struct.pack("<h", int(6000 * math.sin(2 * math.pi * pitch * index / SAMPLE_RATE)
+                                      * (0.6 + 0.4 * math.sin(2 * math.pi * 4 * index / SAMPLE_RATE))))
+                for index in range(SAMPLE_RATE)
+            ))
+
+
+def trim_clip(source_path: str, output_path: str, seconds: float) -> float:
+    with wave.open(source_path, 'rb') as source, wave.open(output_path, 'wb') as output:
+        output.setparams(source.getparams())
+        frames = min(source.getnframes(), int(seconds * source.getframerate()))
+        output.writeframes(source.readframes(frames))
+        return frames / source.getframerate()
+
+
+def run_backend(backend: str, audio_path: str, whisper_model=None) -> None:
+    if backend == "openai-whisper":
+        result = backends.transcriber(backend)(audio_path, whisper_model=whisper_model)
+    else:
+        result = backends.transcriber(backend)(audio_path)
+    if result is None:
+        raise RuntimeError(f"{backend} returned no transcription")
+
+
+def measure(backend: str, short_path: str, short_seconds: float, long_path: str, long_seconds: float) -> dict:
+    whisper_model = None
+    start_time = time.time()
+    if backend == "openai-whisper":
+        import openai_handler
+        whisper_model = openai_handler.load_whisper_model("base")
+    load_seconds = time.time() - start_time
+
+    start_time = time.time()
+    run_backend(backend, short_path, whisper_model)
+    short_time = time.time() - start_time
+
+    start_time = time.time()
+    run_backend(backend, long_path, whisper_model)
+    long_time = time.time() - start_time
+
+    # Two clip lengths separate the per-run cost from the per-second cost
+    rtf = (long_time - short_time) / (long_seconds - short_seconds)
+    if rtf <= 0:
+        rtf = long_time / long_seconds
+    overhead = load_seconds + max(0.0, short_time - rtf * short_seconds)
+    return {
+        "rtf": round(rtf, 4),
+        "overhead": round(overhead, 2),
+        "load_seconds": round(load_seconds, 2),
+        "short_seconds": round(short_time, 2),
+        "long_seconds": round(long_time, 2),
+    }
+
+
+def calibrate(reference_path: str=None, selected: list=None) -> dict:
+    from asi_whisper import whisper_coreML
+
+    candidates = available_backends()
+    if selected:
+        candidates = [backend for backend in candidates if backend in selected]
+    if not candidates:
+        print("\033[91mNo transcription backends are available to calibrate.\033[0m")
+        return {}
+
+    profile = load_profile()
+    profile.setdefault("backends", {})
+
+    with tempfile.TemporaryDirectory(prefix="notetaker_calibration_") as clip_dir:
+        if reference_path:
+            clip_path, clip_seconds = whisper_coreML.audio_normalizer(reference_path)
+            if clip_seconds <= SHORT_CLIP_SECONDS * 2:
+                raise ValueError(f"Reference clip must be longer than {SHORT_CLIP_SECONDS * 2} seconds")
+        else:
+            print("\033[93mNo reference clip given, calibrating on synthetic audio.\033[0m")
+            clip_path = os.path.join(clip_dir, "reference.wav")
+            synthesize_clip(clip_path, LONG_CLIP_SECONDS)
+
+        short_path, long_path = os.path.join(clip_dir, "short.wav"), os.path.join(clip_dir, "long.wav")
+        short_seconds = trim_clip(clip_path, short_path, SHORT_CLIP_SECONDS)
+        long_seconds = trim_clip(clip_path, long_path, LONG_CLIP_SECONDS)
+
+        for backend in candidates:
+            print(f"\nCalibrating {backend} on {short_seconds:.0f}s and {long_seconds:.0f}s clips...")
+            try:
+                profile["backends"][backend] = {**measure(backend, short_path, short_seconds, long_path, long_seconds),
+                                                "measured_at": time.time()}
+            except Exception as e:
+                print(f"\033[91m\tCould not calibrate {backend}: {e}\033[0m")
+
+    save_profile(profile)
+    report(profile)
+    return profile
+
+
+def report(profile: dict=None) -> None:
+    measured = (profile if profile is not None else load_profile()).get("backends", {})
+    if not measured:
+        print("No calibration profile for this host. Run: python main.py calibrate")
+        return
+
+    width = shutil.get_terminal_size((80, 20)).columns
+    print(f"\n{'=' * min(width, 60)}\nCalibration for {host_key()} ({PROFILE_PATH})")
+    for backend, measurement in sorted(measured.items(), key=lambda item: item[1]["rtf"]):
+        hour = predict(backend, 3600, profile or None)
+        print(f"\t{backend}: RTF {measurement['rtf']:.3f}, overhead {measurement['overhead']:.1f}s, "
+              f"about {hour / 60:.1f} minutes per hour of audio")
@@ -0,0 +1,97 @@
+import os, json, hashlib, tempfile, threading
+
+CACHE_ROOT = os.path.expanduser(os.getenv("NOTETAKER_CACHE_DIR", "~/.cache/notetaker"))
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_key(*parts, **fields) -> str:
+    payload = json.dumps({"parts": parts, "fields": fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def evict_files(directory: str, max_bytes: int, suffix: str, keep: str=None) -> None:
+    # Removes the least recently used files ending in suffix until the directory fits in max_bytes
+    entries = []
+    total_bytes = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+    if total_bytes <= max_bytes:
+        return
+
+    for _, size, path in sorted(entries):
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+        if total_bytes <= max_bytes:
+            break
+
+
+class DiskCache:
+    # JSON entries on disk, evicted least-recently-used first once the directory
+    # grows past max_bytes. Recency is tracked through each entry's mtime.
+
+    def __init__(self, name: str, max_bytes: int):
+        self.directory = os.path.join(CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'r') as file:
+                entry = json.load(file)
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"\tDiscarding unreadable cache entry {path}: {e}")
+            self.remove(key)
+            return None
+
+    def put(self, key: str, entry: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".partial")
+        with os.fdopen(handle, 'w') as file:
+            json.dump(entry, file)
+        os.replace(partial_path, path)
+        self.evict()
+
+    def remove(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> None:
+        with self.lock:
+            evict_files(self.directory, self.max_bytes, ".json")
@@ -0,0 +1,202 @@
+# Shared plumbing for every LLM request: pooled HTTP connections, a token-bucket
+# scheduler sized to requests/min and tokens/min, and retries with jittered
+# exponential backoff that honour Retry-After.
+import os, sys, time, random, threading, email.utils
+
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT", "600"))
+MAX_CONNECTIONS = 32
+
+schedulers = {}
+schedulers_lock = threading.Lock()
+shared_http_client = None
+
+
+def http_client():
+    # One keep-alive pool shared by every OpenAI request in the process
+    global shared_http_client
+    with schedulers_lock:
+        if shared_http_client is None:
+            import httpx
+            shared_http_client = httpx.Client(
+                timeout=HTTP_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            )
+    return shared_http_client
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+
+    def acquire(self, amount: float) -> None:
+        if self.capacity <= 0:
+            return
+        # A single request larger than the whole bucket still goes through once it is full
+        amount = min(amount, self.capacity)
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                self.condition.wait((amount - self.tokens) / self.rate)
+
+
+def status_code(error: Exception):
+    code = getattr(error, "status_code", None)
+    if code is None:
+        code = getattr(getattr(error, "response", None), "status_code", None)
+    return code
+
+
+def retry_after(error: Exception):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time()) if retry_at else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if status_code(error) in RETRY_STATUSES:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx and isinstance(error, httpx.TransportError):
+        return True
+    openai = sys.modules.get("openai")
+    return bool(openai) and isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+class Scheduler:
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float, max_in_flight: int):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    def wait_for_turn(self, estimated_tokens: int) -> None:
+        start_time = time.monotonic()
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+        self.slots.acquire()
+        waited = time.monotonic() - start_time
+        with self.lock:
+            self.queue_wait += waited
+            self.max_queue_wait = max(self.max_queue_wait, waited)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def release(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def call(self, function, estimated_tokens: int=0):
+        with self.lock:
+            self.calls += 1
+
+        for attempt in range(MAX_RETRIES + 1):
+            self.wait_for_turn(estimated_tokens)
+            try:
+                with self.lock:
+                    self.attempts += 1
+                return function()
+            except Exception as e:
+                if not is_retryable(e) or attempt == MAX_RETRIES:
+                    with self.lock:
+                        self.failures += 1
+                    raise
+
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+                server_delay = retry_after(e)
+                if server_delay is not None:
+                    delay = max(delay, server_delay)
+                with self.lock:
+                    self.retries += 1
+                    if status_code(e) == 429:
+                        self.rate_limited += 1
+                        # Every caller backs off, not just the one that hit the limit
+                        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                print(f"\t\033[93m{self.name} request failed ({status_code(e) or type(e).__name__}), "
+                      f"retrying in {delay:.1f}s ({attempt + 1}/{MAX_RETRIES})\033[0m")
+            finally:
+                self.release()
+            time.sleep(delay)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "failures": self.failures,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "total_queue_wait": self.queue_wait,
+                "max_queue_wait": self.max_queue_wait,
+            }
+
+
+def scheduler(name: str, requests_per_minute: float=500, tokens_per_minute: float=30000,
+              max_in_flight: int=8) -> Scheduler:
+    # <NAME>_RPM, <NAME>_TPM and <NAME>_MAX_IN_FLIGHT override the defaults; 0 disables a bucket
+    with schedulers_lock:
+        if name not in schedulers:
+            prefix = name.upper()
+            schedulers[name] = Scheduler(
+                name,
+                requests_per_minute=float(os.getenv(f"{prefix}_RPM", requests_per_minute)),
+                tokens_per_minute=float(os.getenv(f"{prefix}_TPM", tokens_per_minute)),
+                max_in_flight=int(os.getenv(f"{prefix}_MAX_IN_FLIGHT", max_in_flight)),
+            )
+        return schedulers[name]
+
+
+def report() -> None:
+    for name, used in schedulers.items():
+        metrics = used.metrics()
+        if not metrics["calls"]:
+            continue
+        print(f"\n\033[1m{name} requests:\033[0m {metrics['calls']} calls, {metrics['attempts']} attempts, "
+              f"{metrics['retries']} retries ({metrics['rate_limited']} rate limited), {metrics['failures']} failed")
+        print(f"\tQueue wait: {metrics['total_queue_wait']:.1f}s total, {metrics['max_queue_wait']:.1f}s max; "
+              f"peak in flight: {metrics['max_in_flight']}")
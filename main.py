@@ -1,11 +1,13 @@
-from idlelib.pyparse import trans
-
-import openai_handler, ollama_handler, markdown_writer
-import os, datetime, argparse, re
+import openai_handler, markdown_writer, batch, backends, llm_client, summary_cache, calibration, tracing
+from text_chunker import count_tokens
+import os, datetime, argparse
 import asi_whisper.realtime_transcription as rtt
+from rolling_summary import RollingSummarizer
+from asi_whisper.whisper_coreML import DEFAULT_WORKERS
+from asi_whisper.segments import FORMATS, SUBTITLE_FORMATS
 
-OLLAMA = 0 # you REALLY don't want to use this.
-OPENAI = 1
+OLLAMA = "ollama"
+OPENAI = "openai"
 
 
 def get_ordinal_suffix(day) -> str:
@@ -25,22 +27,88 @@ def today_date() -> str:
     return f"{month} {day}{get_ordinal_suffix(day)}, {year}"
 
 
-def summarize(transcription: str, provider: int) -> str:
+def summarize(transcription: str, provider: str, stream: bool=False, markdown_path: str=None) -> str:
+    with tracing.span("summarize", provider=provider, input_tokens=count_tokens(transcription)) as attributes:
+        if stream:
+            summary = backends.summarizer(provider)(transcription, stream=True, markdown_path=markdown_path)
+        else:
+            summary = backends.summarizer(provider)(transcription)
+        attributes.update(output_tokens=count_tokens(summary or ""))
+        return summary
+
+
+def make_rolling_summarizer(provider: str, markdown_path: str, interval: float, token_threshold: int) -> RollingSummarizer:
     if provider == OPENAI:
-        return openai_handler.summarize(transcription)
-    elif provider == OLLAMA:
-        return ollama_handler.summarize(transcription)
+        summarize_chunk = lambda text: openai_handler.complete(openai_handler.CHUNK_SYSTEM_PROMPT, text)
+        merge_summaries = openai_handler.merge_summaries
+    else:
+        summarize_chunk = backends.summarizer(provider)
+        merge_summaries = lambda partials: summarize_chunk("\n\n".join(partials))
+
+    return RollingSummarizer(summarize_chunk, merge_summaries, markdown_path, interval, token_threshold)
 
 
 def main():
 
     parser = argparse.ArgumentParser(description="Transcribe and summarize audio recordings.")
-    parser.add_argument("input_audio", help="Path to input audio file, or \"rt\" for real-time transcription.")
+    parser.add_argument("input_audio", help="Path to input audio file, \"rt\" for real-time transcription, or \"calibrate\" to measure the transcription backends on this host. With --batch, a directory or glob.")
     parser.add_argument("output_path", nargs='?', default="./", help="Path to output PDF summary, do not include a file name.")
+    parser.add_argument("--parallel", action="store_true", help="Split long recordings at silences and transcribe the segments in parallel with whisper.cpp (selected automatically unless --backend names another).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Number of parallel transcription workers (default = {DEFAULT_WORKERS}).")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the transcript and summary caches.")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached transcripts and overwrite them with a fresh transcription.")
+    parser.add_argument("--backend", choices=sorted(backends.TRANSCRIBERS), help="Transcription backend (default = fastest calibrated backend for this host and recording).")
+    parser.add_argument("--calibration-clip", help="Reference recording (over 20 seconds) to calibrate on, instead of synthetic audio.")
+    parser.add_argument("--vad", action="store_true", help="Detect speech first and skip long silences when transcribing.")
+    parser.add_argument("--vad-margin", type=float, default=12, help="dB above the noise floor that counts as speech (default = 12).")
+    parser.add_argument("--vad-min-silence", type=int, default=1000, help="Only skip silences at least this many milliseconds long (default = 1000).")
+    parser.add_argument("--no-daemon", action="store_true", help="Transcribe in-process even if a transcription daemon is running.")
+    parser.add_argument("--capture-rtt", help="Also save the raw real-time transcription stream to this file (for benchmarks/bench_rtt_parser.py).")
+    parser.add_argument("--rolling", action="store_true", help="In real-time mode, summarize the transcript in the background as it grows (requires --summarize).")
+    parser.add_argument("--rolling-interval", type=float, default=120, help="Seconds between rolling summary updates (default = 120).")
+    parser.add_argument("--rolling-tokens", type=int, default=2000, help="Update the rolling summary early once this many new tokens arrive (default = 2000).")
+    parser.add_argument("--transcript-format", choices=sorted(FORMATS), default="timestamped", help="How unsummarized transcripts are written; srt and vtt are saved next to the notes (default = timestamped).")
+    parser.add_argument("--no-pdf", action="store_true", help="Only write the Markdown notes, skip PDF rendering.")
+    parser.add_argument("--title", help="Title for the output file, skipping the interactive prompt.")
+    parser.add_argument("--batch", action="store_true", help="Process every recording in a directory or glob, titled after the file names.")
+    parser.add_argument("--summarize", choices=sorted(backends.SUMMARIZERS), help="Summarize the transcription with the given provider before writing.")
+    parser.add_argument("--stream", action="store_true", help="Show the summary as it is generated and write it to the .md as it arrives.")
+    parser.add_argument("--ollama-model", help="Local model for --summarize ollama, e.g. llama3.1:8b-instruct-q4_K_M for a smaller, faster 4-bit variant (default = $OLLAMA_MODEL or llama3.1:8b-instruct-fp16).")
+    parser.add_argument("--ollama-parallel", type=int, help="Chunk requests sent to Ollama at once; match the server's OLLAMA_NUM_PARALLEL (default = $OLLAMA_NUM_PARALLEL or 1).")
+    parser.add_argument("--batch-api", action="store_true", help="In batch mode, submit all OpenAI summaries as one Batch API job instead of live requests.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Default number of workers per batch stage (default = 1).")
+    parser.add_argument("--transcribe-workers", type=int, help="Recordings transcribed at once in batch mode (default = --concurrency).")
+    parser.add_argument("--summarize-workers", type=int, help="Transcripts summarized at once in batch mode (default = --concurrency).")
+    parser.add_argument("--render-workers", type=int, help="Notes rendered at once in batch mode (default = --concurrency).")
+    parser.add_argument("--queue-size", type=int, default=2, help="Items buffered between batch stages (default = 2).")
+    parser.add_argument("--trace", help="Write per-stage timing spans to this file (.json for a Chrome trace, otherwise JSON lines).")
+    parser.add_argument("--profile", nargs="?", const="./profile", help="Profile each stage with cProfile and tracemalloc, saving .prof files to this directory (default = ./profile).")
+    parser.add_argument("--manifest", help=f"Batch manifest path (default = <output_path>/{batch.MANIFEST_NAME}).")
     args = parser.parse_args()
 
+    if args.trace or args.profile:
+        tracing.enable(args.trace, args.profile)
+
+    if args.no_cache:
+        summary_cache.disable()
+
     working_directory = os.getcwd()
 
+    transcribe_options = {
+        "local": True,
+        "workers": args.workers if args.parallel else 1,
+        "use_cache": not args.no_cache,
+        "refresh": args.refresh,
+        "use_daemon": not args.no_daemon,
+        "backend": args.backend,
+        "vad": args.vad,
+        "vad_options": {"margin_db": args.vad_margin, "min_silence_ms": args.vad_min_silence},
+    }
+
+    if args.input_audio == "calibrate":
+        calibration.calibrate(args.calibration_clip, [args.backend] if args.backend else None)
+        return
+
     if args.input_audio != "rt":
         audio_path = os.path.join(working_directory, args.input_audio)
         audio_path = os.path.normpath(audio_path)
@@ -59,30 +127,88 @@ def main():
     print("\033[1mWelcome to notetaker!\n\u00A9 2024 Andrew B. Moore\033[0m")
     print(f"{'=' * (longest_str_len + 2)}")
 
-
-    title_input = input("Please enter a title for the output file (*do not include an extension*, default = \"output\"): ")
-    # tags_input = input("Please input any Bear tags, separated by a space (ex: #usf/ai/notes): ")
-    print()
+    provider = args.summarize
+
+    if args.rolling and (audio_path != "realtime" or provider is None):
+        parser.error("--rolling requires \"rt\" and --summarize")
+
+    if args.batch_api and (not args.batch or provider != OPENAI):
+        parser.error("--batch-api requires --batch and --summarize openai")
+
+    if provider == OLLAMA:
+        backends.load("ollama_handler:configure")(args.ollama_model, args.ollama_parallel)
+
+    if args.batch:
+        output_dir = os.path.normpath(os.path.join(working_directory, args.output_path))
+        batch.run_batch(
+            args.input_audio,
+            output_dir,
+            manifest_path=args.manifest,
+            transcribe_options=transcribe_options,
+            summarize=(lambda transcription: summarize(transcription, provider)) if provider is not None else None,
+            transcribe_workers=args.transcribe_workers or args.concurrency,
+            summarize_workers=args.summarize_workers or args.concurrency,
+            render_workers=args.render_workers or args.concurrency,
+            queue_size=args.queue_size,
+            batch_api=args.batch_api,
+            pdf=not args.no_pdf,
+            transcript_format=args.transcript_format
+        )
+        llm_client.report()
+        summary_cache.report()
+        return
+
+    if args.title is not None:
+        title_input = args.title
+    else:
+        title_input = input("Please enter a title for the output file (*do not include an extension*, default = \"output\"): ")
+        # tags_input = input("Please input any Bear tags, separated by a space (ex: #usf/ai/notes): ")
+        print()
 
     if not title_input:
         title_input = "output"
 
+    output_path = markdown_writer.output_pdf_path(title_input, output_path)
+    rolling_summary = None
+
     if audio_path != "realtime":
-        transcription = openai_handler.transcribe(audio_path=audio_path, local=True)
+        transcript = openai_handler.transcribe(audio_path=audio_path, **transcribe_options)
+        transcription = None
+        if transcript:
+            with tracing.span("format", transcript_format=args.transcript_format, segments=len(transcript)) as attributes:
+                if args.transcript_format in SUBTITLE_FORMATS:
+                    markdown_writer.write_subtitles(transcript, args.transcript_format, output_path)
+                # Summaries only need the words; the timestamps would just cost tokens
+                transcription = transcript.to_text() if provider is not None else transcript.notes(args.transcript_format)
+                attributes.update(characters=len(transcription))
     else:
-        transcription = rtt.start()
+        if args.rolling:
+            rolling_summary = make_rolling_summarizer(provider, output_path.replace(".pdf", ".md"),
+                                                      args.rolling_interval, args.rolling_tokens)
+        transcription = rtt.start(
+            capture_path=args.capture_rtt,
+            on_line=rolling_summary.add if rolling_summary else None
+        )
         # print(transcription)
 
-    # transcription = summarize(transcription, provider=OPENAI)
+    if rolling_summary:
+        try:
+            summary = rolling_summary.finish()
+        except Exception:
+            # Don't lose the end of the session along with the summary
+            rolling_summary.write_transcript(transcription)
+            raise
+        transcription = summary if summary else transcription
+    elif transcription and provider is not None:
+        transcription = summarize(transcription, provider=provider, stream=args.stream,
+                                  markdown_path=output_path.replace(".pdf", ".md"))
     markdown = transcription if transcription else "Transcription failed. Please try again."
 
-    output_title = title_input.replace(" ", "_")
-    output_title = re.sub(r'\W+', '', output_title)
-    output_path = output_path if output_path.lower().endswith(".pdf") else output_path + "/" +  output_title + ".pdf"
-
-    markdown_writer.write(markdown, output_path)
+    markdown_writer.write(markdown, output_path, pdf=not args.no_pdf)
+    llm_client.report()
+    summary_cache.report()
 
-    print(f"Done! Enjoy your notes at {output_path}")
+    print(f"Done! Enjoy your notes at {output_path if not args.no_pdf else output_path.replace('.pdf', '.md')}")
 
 
 if __name__ == '__main__':
@@ -93,3 +219,5 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"An error has occurred: {e}")
         exit(-1)
+    finally:
+        tracing.finish()
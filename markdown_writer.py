@@ -1,79 +1,148 @@
-import markdown2
-import pdfkit
-
-
-html_template = """
-    <html>
-    <head>
-        <style>
-            body {{
-                font-family: 'Helvetica', sans-serif;
-                font-size: 18px;
-                line-height: 1.4;
-                margin: 30px;
-                color: #333;
-            }}
-            h1 {{
-                font-size: 30px;
-                font-weight: bold;
-                margin-bottom: 12px;
-                page-break-before: always;  /* Ensure headings don’t get split */
-            }}
-            h2, h3, h4 {{
-                page-break-inside: avoid;  /* Avoid breaking headers */
-            }}
-            p, ul, li {{
-                font-size: 18px;
-                margin-bottom: 5px;
-                page-break-inside: avoid;  /* Prevent splitting lists and paragraphs */
-            }}
-            ul {{
-                margin-left: 20px;
-                padding-left: 20px;
-                margin-bottom: 5px;
-            }}
-            li {{
-                margin-bottom: 3px;
-            }}
-            strong {{
-                font-size: 18px;
-                font-weight: bold;
-            }}
-            pre {{
-                background-color: #f5f5f5;
-                padding: 10px;
-                border-radius: 5px;
-                font-size: 16px;
-                line-height: 1.4;
-                overflow-x: auto;
-                white-space: pre-wrap;
-                color: #333;
-                page-break-inside: avoid;  /* Prevent code blocks from splitting */
-            }}
-            code {{
-                font-family: 'Courier New', monospace;
-                font-size: 15px;
-                background-color: #f5f5f5;
-                padding: 2px 4px;
-                border-radius: 3px;
-            }}
-        </style>
-    </head>
-    <body>
-        {}
-    </body>
-    </html>
+import re, os, atexit, hashlib, tempfile, threading
+from pdf_renderer import PdfRenderer
+import tracing
+
+
+stylesheet = """
+    body {
+        font-family: 'Helvetica', sans-serif;
+        font-size: 18px;
+        line-height: 1.4;
+        margin: 30px;
+        color: #333;
+    }
+    h1 {
+        font-size: 30px;
+        font-weight: bold;
+        margin-bottom: 12px;
+        page-break-before: always;  /* Ensure headings don’t get split */
+    }
+    h2, h3, h4 {
+        page-break-inside: avoid;  /* Avoid breaking headers */
+    }
+    p, ul, li {
+        font-size: 18px;
+        margin-bottom: 5px;
+        page-break-inside: avoid;  /* Prevent splitting lists and paragraphs */
+    }
+    ul {
+        margin-left: 20px;
+        padding-left: 20px;
+        margin-bottom: 5px;
+    }
+    li {
+        margin-bottom: 3px;
+    }
+    strong {
+        font-size: 18px;
+        font-weight: bold;
+    }
+    pre {
+        background-color: #f5f5f5;
+        padding: 10px;
+        border-radius: 5px;
+        font-size: 16px;
+        line-height: 1.4;
+        overflow-x: auto;
+        white-space: pre-wrap;
+        color: #333;
+        page-break-inside: avoid;  /* Prevent code blocks from splitting */
+    }
+    code {
+        font-family: 'Courier New', monospace;
+        font-size: 15px;
+        background-color: #f5f5f5;
+        padding: 2px 4px;
+        border-radius: 3px;
+    }
 """
 
+renderer = None
+renderer_lock = threading.Lock()
+
+
+def output_pdf_path(title: str, output_path: str) -> str:
+    output_title = title.replace(" ", "_")
+    output_title = re.sub(r'\W+', '', output_title)
+    return output_path if output_path.lower().endswith(".pdf") else output_path + "/" + output_title + ".pdf"
+
+
+def get_renderer() -> PdfRenderer:
+    # One shared renderer, so concurrent writes queue for the same warm workers
+    global renderer
+    with renderer_lock:
+        if renderer is None:
+            renderer = PdfRenderer(stylesheet)
+            # Shuts the worker pool down instead of leaving it to interpreter teardown
+            atexit.register(renderer.close)
+    return renderer
+
+
+def report_rendering() -> None:
+    if renderer is not None:
+        renderer.report()
+
+
+def content_hash(markdown: str) -> str:
+    # Anything that changes the rendered PDF belongs in the hash
+    digest = hashlib.sha256()
+    digest.update(stylesheet.encode("utf-8"))
+    digest.update(get_renderer().engine.encode("utf-8"))
+    digest.update(markdown.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def write_text(text: str, path: str) -> None:
+    partial_path = f"{path}.partial"
+    with open(partial_path, 'w') as file:
+        file.write(text)
+    os.replace(partial_path, path)
+
+
+def write_subtitles(transcript, transcript_format: str, output_path: str) -> str:
+    subtitle_path = output_path.replace(".pdf", f".{transcript_format}")
+    write_text(transcript.export(transcript_format), subtitle_path)
+    print(f"\tWrote {transcript_format.upper()} subtitles to {subtitle_path}")
+    return subtitle_path
+
+
+def render_pdf(markdown: str, output_path: str) -> bool:
+    # Returns False when the PDF on disk already matches this Markdown and stylesheet
+    import markdown2
+
+    hash_path = f"{output_path}.sha256"
+    expected_hash = content_hash(markdown)
+    if os.path.exists(output_path) and os.path.exists(hash_path):
+        with open(hash_path, 'r') as file:
+            if file.read().strip() == expected_hash:
+                print(f"\tPDF is up to date, skipping render of {os.path.basename(output_path)}")
+                return False
+
+    handle, html_path = tempfile.mkstemp(suffix=".html", prefix="notetaker_")
+    try:
+        with tracing.span("html", input_bytes=len(markdown)) as attributes:
+            html_text = markdown2.markdown(markdown, extras=["fenced-code-blocks", "wrap-code"])
+            with os.fdopen(handle, 'w', encoding="utf-8") as file:
+                get_renderer().write_html(html_text, file)
+            attributes.update(output_bytes=os.path.getsize(html_path))
+        with tracing.span("pdf", engine=get_renderer().engine) as attributes:
+            get_renderer().render(html_path, output_path)
+            attributes.update(output_bytes=os.path.getsize(output_path))
+    finally:
+        os.remove(html_path)
+
+    with open(hash_path, 'w') as file:
+        file.write(expected_hash)
+    return True
 
-def write(markdown: str, output_path: str):
-    html_text = markdown2.markdown(markdown, extras=["fenced-code-blocks", "wrap-code"])
 
-    styled_html = html_template.format(html_text)
+def write(markdown: str, output_path: str, pdf: bool=True):
+    with tracing.span("write", input_bytes=len(markdown), pdf=pdf):
+        output_md_path = output_path.replace(".pdf", ".md")
 
-    print(f"\nWriting PDF and Markdown...")
-    pdfkit.from_string(styled_html, output_path)
+        # The Markdown is what matters most, so it is saved before any PDF work starts
+        print(f"\nWriting Markdown{' and PDF' if pdf else ''}...")
+        write_text(markdown, output_md_path)
 
-    output_md_path = output_path.replace(".pdf", ".md")
-    with open(output_md_path, 'w') as file:
-        file.write(markdown)
\ No newline at end of file
+        if pdf:
+            render_pdf(markdown, output_path)
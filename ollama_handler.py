@@ -1,26 +1,218 @@
 from dotenv import load_dotenv
-import os, ollama, requests
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+import llm_client, tracing
+from streaming import StreamWriter
+from text_chunker import chunk_text, count_tokens
 
 load_dotenv()
 
 llama_url = os.getenv("LLAMA_URL")
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "600"))
+OLLAMA_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b-instruct-fp16")
+# Sent with every request, so the model stays loaded between recordings instead of Ollama's 5 minutes
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
+# The KV cache grows with num_ctx (times the server's parallel slots), so cap it below the model's maximum
+MAX_CONTEXT_TOKENS = int(os.getenv("OLLAMA_MAX_CONTEXT", "16384"))
+MIN_CONTEXT_TOKENS = 2048
+EXPECTED_OUTPUT_TOKENS = 2048
+# Token counts come from tiktoken, not the model's own tokenizer, so leave some headroom
+TOKEN_MARGIN = 1.15
+CHUNK_OVERLAP_TOKENS = 200
+MAX_CONDENSE_ROUNDS = 3
 
-def summarize(transcription: str) -> str:
-    system_prompt = ("As an LLM capable of analyzing bodies of text, your job is to produce a comprehensive summary of the input given by the user. "
-                     "Please output in Markdown format, utilizing Markdown's syntax for headers, code blocks, text formatting, etc. "
-                     "Please remove any information unnecessary and not relevant to the content as a whole. "
-                     "Your summary should be long and comprehensive. Do not leave details out. "
-                     "Do not provide any additional information, only provide Markdown.")
+SUMMARY_SYSTEM_PROMPT = (
+    "As an LLM capable of analyzing bodies of text, your job is to produce a comprehensive summary of the input given by the user. "
+    "Please output in Markdown format, utilizing Markdown's syntax for headers, code blocks, text formatting, etc. "
+    "Please remove any information unnecessary and not relevant to the content as a whole. "
+    "Your summary should be long and comprehensive. Do not leave details out. "
+    "Do not provide any additional information, only provide Markdown."
+)
 
-    print(system_prompt)
+CHUNK_SYSTEM_PROMPT = (
+    "As an LLM capable of analyzing bodies of text, your job is to take detailed notes on one part of a longer transcription given by the user. "
+    "Please output in Markdown format, utilizing Markdown's syntax for headers, lists, code blocks, text formatting, etc. "
+    "The part may start or end mid-topic; do not speculate about content outside it. "
+    "Do not include a title. Do not provide any additional information, only provide Markdown."
+)
 
-    prompt = f"[INST] <<SYS>>\n{system_prompt}\n<</SYS>>\n\n{transcription} [/INST]"
+REDUCE_SYSTEM_PROMPT = (
+    "As an LLM capable of analyzing bodies of text, your job is to merge partial Markdown notes, taken on consecutive parts of one transcription "
+    "and separated by '---', into a single comprehensive summary. Combine repeated material, keep the order of topics, and do not leave details out. "
+    "Do not provide any additional information, only provide Markdown."
+)
+
+model = OLLAMA_MODEL
+parallel = OLLAMA_PARALLEL
+
+ollama_client = None
+client_lock = threading.Lock()
+context_lengths = {}
+warm_contexts = set()
+warm_lock = threading.Lock()
+
+
+def configure(model_name: str=None, parallel_requests: int=None) -> None:
+    # Called before the first request; the scheduler keeps whatever parallelism it was created with
+    global model, parallel
+    if model_name:
+        model = model_name
+    if parallel_requests:
+        parallel = parallel_requests
+
+
+def get_client():
+    # One client, so every request reuses the same keep-alive connection pool
+    global ollama_client
+    with client_lock:
+        if ollama_client is None:
+            import ollama
+            ollama_client = ollama.Client(host=llama_url, timeout=OLLAMA_TIMEOUT)
+    return ollama_client
+
+
+def get_scheduler() -> llm_client.Scheduler:
+    # A local server has no request or token quotas, only limited parallelism
+    return llm_client.scheduler("ollama", requests_per_minute=0, tokens_per_minute=0, max_in_flight=parallel)
+
+
+def estimate_tokens(text: str) -> int:
+    return int(count_tokens(text) * TOKEN_MARGIN)
+
+
+def model_context(model_name: str) -> int:
+    # The model's trained context length from /api/show, capped at MAX_CONTEXT_TOKENS
+    if model_name not in context_lengths:
+        import ollama
+        try:
+            info = get_client().show(model_name).modelinfo or {}
+        except ollama.ResponseError as e:
+            if e.status_code == 404:
+                raise RuntimeError(f"Ollama model {model_name} is not available, run `ollama pull {model_name}`") from e
+            raise
+        trained = next((value for key, value in info.items() if key.endswith(".context_length")), None)
+        context_lengths[model_name] = min(int(trained), MAX_CONTEXT_TOKENS) if trained else MAX_CONTEXT_TOKENS
+    return context_lengths[model_name]
+
+
+def context_size(tokens: int, limit: int) -> int:
+    # Ollama reloads the model whenever num_ctx changes, so round up to a power of two and let
+    # inputs of similar length share one loaded context
+    size = MIN_CONTEXT_TOKENS
+    while size < tokens:
+        size *= 2
+    return min(size, limit)
+
+
+def warm_up(num_ctx: int) -> None:
+    # An empty prompt only loads the model; keep_alive pins it for the requests that follow
+    with warm_lock:
+        if (model, num_ctx) in warm_contexts:
+            return
+        start_time = time.time()
+        with tracing.span("summarize.load", model=model, num_ctx=num_ctx):
+            get_client().generate(model=model, prompt="", keep_alive=KEEP_ALIVE, options={"num_ctx": num_ctx})
+        print(f"\tLoaded {model} with a {num_ctx} token context in {time.time() - start_time:.2f}s")
+        warm_contexts.add((model, num_ctx))
+
+
+def complete(system_prompt: str, content: str, num_ctx: int, stream: bool=False, markdown_path: str=None) -> str:
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": content},
+    ]
+    options = {"num_ctx": num_ctx}
+
+    if not stream:
+        response = get_scheduler().call(
+            lambda: get_client().chat(model=model, messages=messages, options=options, keep_alive=KEEP_ALIVE)
+        )
+        return response['message']['content']
+
+    client = get_client()
+    writer = StreamWriter("Ollama", markdown_path)
+
+    def read_stream() -> (int, float):
+        # The stream is lazy: the request itself only happens while iterating, so it is read
+        # entirely inside the scheduled call
+        writer.reset()
+        completion_tokens, generation_seconds = None, None
+        for chunk in client.chat(model=model, messages=messages, options=options, keep_alive=KEEP_ALIVE, stream=True):
+            writer.write(chunk['message']['content'])
+            if chunk.get('done'):
+                # Ollama reports its own generation token count and duration (in nanoseconds)
+                completion_tokens = chunk.get('eval_count')
+                generation_seconds = (chunk.get('eval_duration') or 0) / 1e9 or None
+        return completion_tokens, generation_seconds
 
     try:
-        response = ollama.generate(model="llama3.1:8b-instruct-fp16", prompt=prompt)
-        return response['response']
-    except Exception as e:
-        print(f"An error has occurred: {e}.")
-        exit(-1)
+        completion_tokens, generation_seconds = get_scheduler().call(read_stream)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close(completion_tokens, generation_seconds)
+
+
+def summarize_chunks(chunks: list, num_ctx: int) -> list:
+    def summarize_chunk(index: int) -> str:
+        start_time = time.time()
+        with tracing.span("summarize.chunk", index=index, input_tokens=count_tokens(chunks[index])) as attributes:
+            summary = complete(CHUNK_SYSTEM_PROMPT, chunks[index], num_ctx)
+            attributes.update(output_characters=len(summary))
+        print(f"\tChunk {index + 1}/{len(chunks)} summarized in {time.time() - start_time:.2f}s "
+              f"({count_tokens(chunks[index])} tokens in, {len(summary)} characters out)")
+        return summary
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        return list(pool.map(summarize_chunk, range(len(chunks))))
+
+
+def summarize(transcription: str, stream: bool=False, markdown_path: str=None) -> str:
+    print(f"\nSending transcription to Ollama ({model}) for summarization...")
+    limit = model_context(model)
+    needed_tokens = estimate_tokens(SUMMARY_SYSTEM_PROMPT) + estimate_tokens(transcription) + EXPECTED_OUTPUT_TOKENS
+
+    if needed_tokens <= limit:
+        num_ctx = context_size(needed_tokens, limit)
+        warm_up(num_ctx)
+        summary = complete(SUMMARY_SYSTEM_PROMPT, transcription, num_ctx, stream, markdown_path)
+        print(f"Summarization received of length: {len(summary)}")
+        return summary
+
+    # Every request of a split transcript uses the full window, so the model is loaded once
+    num_ctx = limit
+    warm_up(num_ctx)
+    prompt_tokens = max(estimate_tokens(CHUNK_SYSTEM_PROMPT), estimate_tokens(REDUCE_SYSTEM_PROMPT))
+    chunk_tokens = int((limit - prompt_tokens - EXPECTED_OUTPUT_TOKENS) / TOKEN_MARGIN)
+    chunks = chunk_text(transcription, chunk_tokens, CHUNK_OVERLAP_TOKENS)
+    print(f"\tTranscription is {count_tokens(transcription)} tokens, over the {limit} token context; "
+          f"summarizing {len(chunks)} chunks ({parallel} at a time)...")
+    partials = summarize_chunks(chunks, num_ctx)
+
+    # Partial summaries can themselves outgrow the context on very long recordings. Each
+    # round must shrink them, and there are only a few rounds, so this always ends.
+    for _ in range(MAX_CONDENSE_ROUNDS):
+        partial_tokens = estimate_tokens("\n\n---\n\n".join(partials))
+        if partial_tokens <= chunk_tokens * TOKEN_MARGIN or len(partials) <= 1:
+            break
+        groups = chunk_text("\n\n".join(partials), chunk_tokens)
+        if len(groups) >= len(partials):
+            print(f"\t\033[93mPartial summaries ({partial_tokens} tokens) can't be grouped any further, "
+                  f"merging them as they are\033[0m")
+            break
+        print(f"\tCondensing {len(partials)} partial summaries into {len(groups)}...")
+        partials = summarize_chunks(groups, num_ctx)
+        if estimate_tokens("\n\n---\n\n".join(partials)) >= partial_tokens:
+            print("\t\033[93mCondensing did not shrink the partial summaries, merging them as they are\033[0m")
+            break
 
+    joined = "\n\n---\n\n".join(partials)
+    start_time = time.time()
+    with tracing.span("summarize.reduce", partials=len(partials), input_tokens=count_tokens(joined)) as attributes:
+        summary = complete(REDUCE_SYSTEM_PROMPT, joined, num_ctx, stream, markdown_path)
+        attributes.update(output_characters=len(summary))
+    print(f"\tMerged {len(partials)} partial summaries in {time.time() - start_time:.2f}s")
+    print(f"Summarization received of length: {len(summary)}")
+    return summary
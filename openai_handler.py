@@ -1,125 +1,655 @@
-import torch.backends.mps
-from openai import OpenAI
-import whisper
-
 from asi_whisper import whisper_coreML
+from asi_whisper.segments import SegmentStore
+from text_chunker import chunk_content_defined, count_tokens
+from streaming import StreamWriter
+from disk_cache import hash_file
+import transcript_cache, summary_cache, transcription_daemon, llm_client, calibration, markdown_writer, tracing
 
 from dotenv import load_dotenv
-import os, time
+import os, time, json, uuid, random, shutil, hashlib, threading, tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
 AUDIO_BASE_PATH = "./audio/"
 MD_OUTPUT_PATH = "./output/"
 
-client = OpenAI(
-    api_key=os.getenv('OPENAI_SECRET')
+loaded_models = {}
+
+SUMMARY_MODEL = "gpt-4o"
+SUMMARY_TEMPERATURE = 0
+MAP_REDUCE_THRESHOLD_TOKENS = 12000
+CHUNK_TOKENS = 6000
+CHUNK_OVERLAP_TOKENS = 200
+MAX_CONCURRENT_CHUNKS = 4
+MAX_CONDENSE_ROUNDS = 3
+EXPECTED_OUTPUT_TOKENS = 1500
+
+CLOUD_UPLOAD_BITRATE_KBPS = 24
+CLOUD_CHUNK_BYTES = int(os.getenv("OPENAI_UPLOAD_CHUNK_MB", "20")) * 1000 * 1000
+CLOUD_UPLOAD_WORKERS = 4
+
+BATCH_POLL_INITIAL_SECONDS = 5
+BATCH_POLL_MAX_SECONDS = 300
+BATCH_FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You are an LLM tasked with analyzing and summarizing text provided by the user. "
+    "Your output must be formatted using Markdown syntax, including headers, code blocks, bold, italics, lists, and other Markdown elements where appropriate. "
+    "Summaries should prioritize comprehensive explanations of concepts, particularly for algorithms, methods, or other technical details. "
+    "Provide pseudocode only when necessary, and ensure that the pseudocode is minimal and serves as a supplement to the explanation rather than the main focus. "
+    "Exclude any irrelevant or unnecessary information. The output must be clear, concise, and readable, focusing on conveying understanding over the generation of code. "
+    "Ensure all responses are in well-formatted Markdown without any additional comments or non-relevant information. "
+    "Do not wrap the output. "
+    "Include a descriptive but concise title as the first line. "
+)
+# SUMMARY_SYSTEM_PROMPT = (
+#     "You are an LLM tasked with summarizing and analyzing text provided by the user. "
+#     "Your output must be structured using Markdown syntax, employing headers, code blocks, bold, italics, lists, and other Markdown elements appropriately. "
+#     "Ensure that the summary is concise yet comprehensive, focusing only on the most relevant and meaningful information from the input. "
+#     "Exclude any unnecessary or extraneous details. Provide thorough explanations where needed, but ensure clarity and readability. "
+#     "The output should only consist of well-formatted Markdown content without any additional information or comments. "
+#     "Do not wrap the output."
+# )
+
+CHUNK_SYSTEM_PROMPT = (
+    "You are an LLM tasked with taking detailed notes on one part of a longer transcription provided by the user. "
+    "Cover every concept, method, and technical detail in this part, using Markdown headers, lists, bold, italics, and code blocks where appropriate. "
+    "The part may start or end mid-topic and may repeat a few lines of the previous part; do not speculate about content outside it. "
+    "Do not include a title and do not add any comments that are not notes. "
 )
 
+REDUCE_SYSTEM_PROMPT = (
+    "You are an LLM tasked with merging partial Markdown notes, taken on consecutive parts of one transcription and separated by '---', into a single summary. "
+    "Combine overlapping or repeated material, keep the order of topics, and keep every concept, method, and technical detail. "
+    "The merged summary must follow these instructions: "
+    + SUMMARY_SYSTEM_PROMPT
+)
+
+openai_client = None
+client_lock = threading.Lock()
+
+
+def get_client():
+    # The OpenAI SDK is only imported and the client only built once something needs it
+    global openai_client
+    with client_lock:
+        if openai_client is None:
+            from openai import OpenAI
+            # Retries are left to llm_client so they share one backoff and rate budget
+            openai_client = OpenAI(
+                api_key=os.getenv('OPENAI_SECRET'),
+                base_url=os.getenv('OPENAI_BASE_URL'),
+                http_client=llm_client.http_client(),
+                max_retries=0
+            )
+    return openai_client
+
+
+def mps_available() -> bool:
+    try:
+        import torch.backends.mps
+    except ImportError:
+        return False
+    return torch.backends.mps.is_available()
+
 def elapsed_time_str(elapsed_time):
     elapsed_minutes = int(elapsed_time // 60)
     elapsed_seconds = int(round(elapsed_time % 60))
     return "\033[94m" + f"Elapsed time: {elapsed_minutes:.0f} minute{'s' if elapsed_minutes > 1 else ''}, {elapsed_seconds} second{'s' if elapsed_seconds > 1 else ''}." + "\033[0m"
 
 
-def transcribe_cloud(audio_path: str) -> str:
-    try:
-        with open(audio_path, 'rb') as audio_file:
-            transcription = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-            return transcription.text
-    except FileNotFoundError:
-        print(f"File not found: {audio_path}")
-        exit(-1)
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        exit(-1)
+def upload_for_transcription(upload_path: str, offset_ms: int) -> (str, list):
+    def request():
+        with open(upload_path, 'rb') as audio_file:
+            return get_client().audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                response_format="verbose_json"
+            )
+
+    start_time = time.time()
+    transcription = llm_client.scheduler("openai").call(request)
+    print(f"\tUploaded and transcribed {os.path.basename(upload_path)} "
+          f"({os.path.getsize(upload_path) / 1e6:.1f} MB) in {time.time() - start_time:.1f}s")
 
+    segments = [
+        (round(segment.start * 1000) + offset_ms, round(segment.end * 1000) + offset_ms, segment.text.strip())
+        for segment in (transcription.segments or [])
+    ]
+    return transcription.text.strip(), segments
+
+
+def transcribe_cloud(audio_path: str) -> (str, list):
+    wav_path, audio_len = whisper_coreML.audio_normalizer(audio_path)
+    estimated_bytes = audio_len * CLOUD_UPLOAD_BITRATE_KBPS * 1000 / 8
+
+    with tempfile.TemporaryDirectory(prefix="notetaker_upload_") as upload_dir:
+        if estimated_bytes <= CLOUD_CHUNK_BYTES:
+            chunks = [(wav_path, 0)]
+        else:
+            # Cut at silences so no chunk's compressed size goes over the limit
+            max_chunk_seconds = CLOUD_CHUNK_BYTES * 8 / (CLOUD_UPLOAD_BITRATE_KBPS * 1000)
+            split_points, total_frames = whisper_coreML.find_split_points(wav_path, max_chunk_seconds)
+            chunks = whisper_coreML.export_segments(wav_path, split_points, total_frames, upload_dir)
+
+        uploads = [
+            (
+                whisper_coreML.transcode_for_upload(
+                    chunk_path,
+                    os.path.join(upload_dir, f"upload_{index:04d}.ogg"),
+                    f"{CLOUD_UPLOAD_BITRATE_KBPS}k"
+                ),
+                offset_ms
+            )
+            for index, (chunk_path, offset_ms) in enumerate(chunks)
+        ]
+        print(f"\tUploading {len(uploads)} compressed chunk{'s' if len(uploads) != 1 else ''} "
+              f"({CLOUD_UPLOAD_WORKERS} at a time)...")
 
-def load_whisper_model(model_size: str="base") -> whisper.Whisper:
+        with ThreadPoolExecutor(max_workers=CLOUD_UPLOAD_WORKERS) as pool:
+            results = list(pool.map(lambda upload: upload_for_transcription(*upload), uploads))
+
+    text = " ".join(chunk_text for chunk_text, _ in results if chunk_text)
+    segments = [segment for _, chunk_segments in results for segment in chunk_segments]
+    return text, segments
+
+
+def load_whisper_model(model_size: str="base") -> "whisper.Whisper":
+    if model_size in loaded_models:
+        return loaded_models[model_size]
     try:
+        import whisper
         print(f"Loading Whisper model: {model_size}")
-        model = whisper.load_model(model_size).to("mps")
+        device = "mps" if mps_available() else "cpu"
+        model = whisper.load_model(model_size).to(device)
         print(f"Loaded model: {model}")
+        loaded_models[model_size] = model
         return model
     except Exception as e:
-        print(f"Error loading Whisper model: {e}")
-        exit(-1)
+        raise RuntimeError(f"Error loading Whisper model {model_size}: {e}") from e
 
 
-def transcribe_local(audio_path: str, whisper_model: whisper.Whisper) -> str:
+def transcribe_local(audio_path: str, whisper_model: "whisper.Whisper") -> (str, list):
     try:
         result = whisper_model.transcribe(audio_path)
         print(result)
-        return result["text"]
+        segments = [
+            (round(segment["start"] * 1000), round(segment["end"] * 1000), segment["text"].strip())
+            for segment in result["segments"]
+        ]
+        return result["text"], segments
 
-    except FileNotFoundError:
-        print(f"File not found: {audio_path}")
-        exit(-1)
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"File not found: {audio_path}") from e
 
 
-def transcribe(audio_path: str, local: bool=True) -> str:
-    if local:
-        start_time = time.time()
-        print("Starting local transcription... This may take a while.")
-        if torch.backends.mps.is_available():
-            transcription = whisper_coreML.transcribe(audio_path)
+def segment_store(text: str, segments: list) -> SegmentStore:
+    return SegmentStore.from_segments(segments) if segments else SegmentStore.from_text(text)
+
+
+def cached_transcript(cached: dict, attributes: dict) -> SegmentStore:
+    print(f"Using cached {cached['backend']} transcription ({len(cached['segments'])} segments).")
+    attributes.update(backend=cached["backend"], model=cached["model"], cached=True, segments=len(cached["segments"]))
+    return segment_store(cached["text"], cached["segments"])
+
+
+def transcription_backend(local: bool=True, daemon_status: dict=None, backend: str=None,
+                          audio_seconds: float=None, workers: int=1) -> (str, str):
+    if backend == "openai-cloud" or not local:
+        return "openai-cloud", "whisper-1"
+    if workers > 1 and backend is None:
+        # Only whisper.cpp splits a recording across workers, so --parallel asks for it
+        backend = "whisper.cpp"
+    if daemon_status and backend in (None, "openai-whisper"):
+        return "openai-whisper", daemon_status["model"]
+    if backend is None:
+        # Prefer whatever this host measured as fastest for a recording of this length
+        backend = calibration.fastest(calibration.LOCAL_BACKENDS, audio_seconds)
+    if backend is None:
+        # No measurements yet: take the first backend that is actually installed or configured
+        available = calibration.available_backends()
+        if not available:
+            raise RuntimeError("No transcription backend is available: install whisper.cpp or openai-whisper, "
+                               "or set OPENAI_SECRET")
+        backend = available[0]
+    if backend == "openai-cloud":
+        return "openai-cloud", "whisper-1"
+    if backend == "whisper.cpp":
+        return "whisper.cpp", os.path.basename(whisper_coreML.get_paths()[1])
+    return "openai-whisper", "base"
+
+
+def transcribe(audio_path: str, local: bool=True, workers: int=1, use_cache: bool=True, refresh: bool=False,
+               use_daemon: bool=True, backend: str=None, vad: bool=False, vad_options: dict=None) -> SegmentStore:
+    with tracing.span("transcribe", input_bytes=os.path.getsize(audio_path)) as attributes:
+        vad_flags = {"vad": vad_options or {}} if vad else {}
+        if use_cache:
+            audio_hash = hash_file(audio_path)
+            # Keyed by what was asked for, so a repeat run is answered before the daemon query and backend resolution
+            request_key = transcript_cache.request_key(audio_hash, backend, local, chunked=workers > 1, **vad_flags)
+            cached = None if refresh else transcript_cache.lookup_request(request_key)
+            if cached:
+                return cached_transcript(cached, attributes)
+
+        audio_seconds = whisper_coreML.audio_duration(audio_path)
+        daemon_status = transcription_daemon.status() if local and use_daemon and backend != "openai-cloud" else None
+        backend, model = transcription_backend(local, daemon_status, backend, audio_seconds, workers)
+        attributes.update(backend=backend, model=model, audio_seconds=audio_seconds)
+        local = backend != "openai-cloud"
+        daemon_status = daemon_status if backend == "openai-whisper" else None
+        if workers > 1 and backend != "whisper.cpp":
+            print(f"\t\033[93m--parallel only applies to whisper.cpp, transcribing with {backend} in one piece\033[0m")
+            workers = 1
+
+        if use_cache:
+            cache_key = transcript_cache.cache_key(audio_hash, backend, model, chunked=workers > 1, **vad_flags)
+            cached = None if refresh else transcript_cache.lookup(cache_key)
+            if cached:
+                transcript_cache.store_request(request_key, cache_key)
+                return cached_transcript(cached, attributes)
+
+        offset_map = None
+        if vad:
+            from asi_whisper.vad import speech_only_audio
+            # Transcribe only the speech; the offset map takes timestamps back to the original
+            audio_path, offset_map = speech_only_audio(audio_path, **(vad_options or {}))
+            if offset_map:
+                audio_seconds = whisper_coreML.audio_duration(audio_path)
+
+        expected_seconds = calibration.predict(backend, audio_seconds)
+        if expected_seconds is not None:
+            print(f"Transcribing {audio_seconds:.0f}s of audio with {backend}, "
+                  f"expected to take about {expected_seconds:.0f}s on this host.")
+
+        if local:
+            start_time = time.time()
+            print("Starting local transcription... This may take a while.")
+            if daemon_status:
+                print(f"\tSubmitting to transcription daemon ({model}, {daemon_status['queued']} jobs queued)...")
+                result = transcription_daemon.submit(audio_path)
+                transcript = segment_store(result["text"], result["segments"])
+                print(f"\tDaemon model load: {result['load_time']:.2f}s (once), queue wait: {result['queue_time']:.2f}s, "
+                      f"inference: {result['inference_time']:.2f}s")
+            elif backend == "whisper.cpp":
+                transcript = whisper_coreML.transcribe(audio_path, workers=workers, expected_seconds=expected_seconds)
+            else:
+                whisper_model = load_whisper_model(model)
+                transcript = segment_store(*transcribe_local(audio_path, whisper_model=whisper_model))
+            elapsed_time = time.time() - start_time
+            print(f"\tFinished local transcription.\n{elapsed_time_str(elapsed_time)}")
         else:
-            model = load_whisper_model()
-            transcription = transcribe_local(audio_path, whisper_model=model)
-        elapsed_time = time.time() - start_time
-        print(f"\tFinished local transcription.\n{elapsed_time_str(elapsed_time)}")
-    else:
-        print("Starting cloud transcription...")
+            print("Starting cloud transcription...")
+            start_time = time.time()
+            transcript = segment_store(*transcribe_cloud(audio_path))
+            elapsed_time = time.time() - start_time
+            print(f"Finished cloud transcription.\n{elapsed_time_str(elapsed_time)}")
+
+        if offset_map and transcript:
+            from asi_whisper.vad import remap_segments
+            transcript = SegmentStore.from_segments(remap_segments(transcript, offset_map))
+
+        attributes.update(cached=False, segments=len(transcript) if transcript else 0)
+        if use_cache and transcript:
+            transcript_cache.store(cache_key, transcript.to_text(), list(transcript), backend, model)
+            transcript_cache.store_request(request_key, cache_key)
+
+        return transcript
+
+
+def complete(system_prompt: str, content: str) -> str:
+    cache_key = summary_cache.cache_key(SUMMARY_MODEL, system_prompt, SUMMARY_TEMPERATURE, content)
+    cached = summary_cache.lookup(cache_key)
+    if cached is not None:
+        return cached
+
+    estimated_tokens = count_tokens(system_prompt) + count_tokens(content) + EXPECTED_OUTPUT_TOKENS
+    response = llm_client.scheduler("openai").call(
+        lambda: get_client().chat.completions.create(
+            model=SUMMARY_MODEL,
+            temperature=SUMMARY_TEMPERATURE,
+            messages=[
+                {
+                    "role":"system",
+                    "content": system_prompt
+                },
+                {
+                    "role":"user",
+                    "content": content
+                }
+            ]
+        ),
+        estimated_tokens=estimated_tokens
+    )
+
+    if response is None or not response.choices:
+        raise RuntimeError("GPT summarization response is empty")
+    summary = response.choices[0].message.content
+    usage = response.usage
+    summary_cache.store(cache_key, summary, SUMMARY_MODEL,
+                        usage.prompt_tokens if usage else estimated_tokens - EXPECTED_OUTPUT_TOKENS,
+                        usage.completion_tokens if usage else count_tokens(summary))
+    return summary
+
+
+def complete_stream(system_prompt: str, content: str, markdown_path: str=None) -> str:
+    cache_key = summary_cache.cache_key(SUMMARY_MODEL, system_prompt, SUMMARY_TEMPERATURE, content)
+    cached = summary_cache.lookup(cache_key)
+    if cached is not None:
+        # Still shown and written to the .md, just all at once (and atomically, like the stream)
+        print(cached)
+        if markdown_path:
+            markdown_writer.write_text(cached, markdown_path)
+        print("\033[94mOpenAI: reused the cached summary\033[0m")
+        return cached
+
+    estimated_tokens = count_tokens(system_prompt) + count_tokens(content) + EXPECTED_OUTPUT_TOKENS
+    client = get_client()
+    writer = StreamWriter("OpenAI", markdown_path)
+
+    def read_stream() -> (int, int):
+        # The whole stream is read inside the scheduled call, so it holds its in-flight slot
+        # until the last token and a failure mid-stream is retried from the start
+        writer.reset()
+        stream = client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            temperature=SUMMARY_TEMPERATURE,
+            stream=True,
+            stream_options={"include_usage": True},
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content}
+            ]
+        )
+        prompt_tokens, completion_tokens = None, None
+        for chunk in stream:
+            if chunk.choices:
+                writer.write(chunk.choices[0].delta.content)
+            if chunk.usage:
+                prompt_tokens, completion_tokens = chunk.usage.prompt_tokens, chunk.usage.completion_tokens
+        return prompt_tokens, completion_tokens
+
+    try:
+        prompt_tokens, completion_tokens = llm_client.scheduler("openai").call(read_stream,
+                                                                               estimated_tokens=estimated_tokens)
+        if not writer.parts:
+            raise RuntimeError("GPT summarization response is empty")
+    except BaseException:
+        writer.abort()
+        raise
+
+    summary = writer.close(completion_tokens)
+    summary_cache.store(cache_key, summary, SUMMARY_MODEL,
+                        prompt_tokens or estimated_tokens - EXPECTED_OUTPUT_TOKENS,
+                        completion_tokens or count_tokens(summary))
+    return summary
+
+
+def summarize_chunks(chunks: list, max_concurrency: int=MAX_CONCURRENT_CHUNKS) -> list:
+    def summarize_chunk(index: int) -> str:
         start_time = time.time()
-        transcription = transcribe_cloud(audio_path)
-        elapsed_time = time.time() - start_time
-        print(f"Finished cloud transcription.\n{elapsed_time_str(elapsed_time)}")
+        with tracing.span("summarize.chunk", index=index, input_tokens=count_tokens(chunks[index])) as attributes:
+            summary = complete(CHUNK_SYSTEM_PROMPT, chunks[index])
+            attributes.update(output_characters=len(summary))
+        print(f"\tChunk {index + 1}/{len(chunks)} summarized in {time.time() - start_time:.2f}s "
+              f"({count_tokens(chunks[index])} tokens in, {len(summary)} characters out)")
+        return summary
 
-    return transcription
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        return list(pool.map(summarize_chunk, range(len(chunks))))
 
 
-def summarize(transcription: str) -> str:
+def merge_summaries(partials: list, stream: bool=False, markdown_path: str=None) -> str:
+    joined = "\n\n---\n\n".join(partials)
+    start_time = time.time()
+    with tracing.span("summarize.reduce", partials=len(partials), input_tokens=count_tokens(joined)) as attributes:
+        if stream:
+            summary = complete_stream(REDUCE_SYSTEM_PROMPT, joined, markdown_path)
+        else:
+            summary = complete(REDUCE_SYSTEM_PROMPT, joined)
+        attributes.update(output_characters=len(summary))
+    print(f"\tMerged {len(partials)} partial summaries in {time.time() - start_time:.2f}s")
+    return summary
+
+
+def reduce_partials(partials: list, chunk_tokens: int=CHUNK_TOKENS, max_concurrency: int=MAX_CONCURRENT_CHUNKS,
+                    stream: bool=False, markdown_path: str=None) -> str:
+    # Partial summaries can themselves outgrow the context on very long recordings. Each
+    # round must shrink them, and there are only a few rounds, so this can't bill forever.
+    for _ in range(MAX_CONDENSE_ROUNDS):
+        partial_tokens = count_tokens("\n\n".join(partials))
+        if partial_tokens <= MAP_REDUCE_THRESHOLD_TOKENS or len(partials) <= 1:
+            break
+        groups = chunk_content_defined("\n\n".join(partials), chunk_tokens)
+        if len(groups) >= len(partials):
+            print(f"\t\033[93mPartial summaries ({partial_tokens} tokens) can't be grouped any further, "
+                  f"merging them as they are\033[0m")
+            break
+        print(f"\tCondensing {len(partials)} partial summaries into {len(groups)}...")
+        partials = summarize_chunks(groups, max_concurrency)
+        if count_tokens("\n\n".join(partials)) >= partial_tokens:
+            print("\t\033[93mCondensing did not shrink the partial summaries, merging them as they are\033[0m")
+            break
+
+    return merge_summaries(partials, stream, markdown_path)
+
+
+def summarize(transcription: str, chunk_tokens: int=CHUNK_TOKENS, overlap_tokens: int=CHUNK_OVERLAP_TOKENS,
+              max_concurrency: int=MAX_CONCURRENT_CHUNKS, stream: bool=False, markdown_path: str=None) -> str:
     print(f"\nSending transcription to OpenAI for summarization...")
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
-            {
-                "role":"system",
-                "content": "You are an LLM tasked with analyzing and summarizing text provided by the user. "
-                           "Your output must be formatted using Markdown syntax, including headers, code blocks, bold, italics, lists, and other Markdown elements where appropriate. "
-                           "Summaries should prioritize comprehensive explanations of concepts, particularly for algorithms, methods, or other technical details. "
-                           "Provide pseudocode only when necessary, and ensure that the pseudocode is minimal and serves as a supplement to the explanation rather than the main focus. "
-                           "Exclude any irrelevant or unnecessary information. The output must be clear, concise, and readable, focusing on conveying understanding over the generation of code. "
-                           "Ensure all responses are in well-formatted Markdown without any additional comments or non-relevant information. "
-                           "Do not wrap the output. "
-                           "Include a descriptive but concise title as the first line. "
-                # "content": "You are an LLM tasked with summarizing and analyzing text provided by the user. "
-                #            "Your output must be structured using Markdown syntax, employing headers, code blocks, bold, italics, lists, and other Markdown elements appropriately. "
-                #            "Ensure that the summary is concise yet comprehensive, focusing only on the most relevant and meaningful information from the input. "
-                #            "Exclude any unnecessary or extraneous details. Provide thorough explanations where needed, but ensure clarity and readability. "
-                #            "The output should only consist of well-formatted Markdown content without any additional information or comments. "
-                #            "Do not wrap the output."
-            },
-            {
-                "role":"user",
-                "content": transcription
-            }
-        ]
-    )
+    transcription_tokens = count_tokens(transcription)
+
+    if transcription_tokens <= MAP_REDUCE_THRESHOLD_TOKENS:
+        if stream:
+            summary = complete_stream(SUMMARY_SYSTEM_PROMPT, transcription, markdown_path)
+        else:
+            summary = complete(SUMMARY_SYSTEM_PROMPT, transcription)
+    else:
+        # Content-defined boundaries keep unchanged chunks identical between runs, so only
+        # chunks touched by an edit miss the summary cache
+        chunks = chunk_content_defined(transcription, chunk_tokens, overlap_tokens)
+        print(f"\tTranscription is {transcription_tokens} tokens, summarizing {len(chunks)} chunks "
+              f"({max_concurrency} at a time)...")
+        partials = summarize_chunks(chunks, max_concurrency)
+        summary = reduce_partials(partials, chunk_tokens, max_concurrency, stream, markdown_path)
+
+    print(f"Summarization received of length: {len(summary)}")
+    return summary
+
+class OpenAIBatchEndpoint:
+
+    def submit(self, input_path: str) -> str:
+        scheduler = llm_client.scheduler("openai")
+
+        def upload():
+            with open(input_path, 'rb') as input_file:
+                return get_client().files.create(file=input_file, purpose="batch")
+
+        uploaded = scheduler.call(upload)
+        batch = scheduler.call(lambda: get_client().batches.create(
+            input_file_id=uploaded.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        ))
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return llm_client.scheduler("openai").call(lambda: get_client().batches.retrieve(batch_id)).status
+
+    def results(self, batch_id: str) -> str:
+        scheduler = llm_client.scheduler("openai")
+        batch = scheduler.call(lambda: get_client().batches.retrieve(batch_id))
+        if not batch.output_file_id:
+            return ""
+        return scheduler.call(lambda: get_client().files.content(batch.output_file_id)).text
+
+
+class FileBatchEndpoint:
+    # Directory-based stand-in for the Batch API, served by stubs/batch_worker.py
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        batch_directory = os.path.join(self.directory, batch_id)
+        os.makedirs(batch_directory)
+        shutil.copyfile(input_path, os.path.join(batch_directory, "input.jsonl"))
+        with open(os.path.join(batch_directory, "status"), 'w') as status_file:
+            status_file.write("validating")
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        with open(os.path.join(self.directory, batch_id, "status"), 'r') as status_file:
+            return status_file.read().strip()
+
+    def results(self, batch_id: str) -> str:
+        output_path = os.path.join(self.directory, batch_id, "output.jsonl")
+        if not os.path.exists(output_path):
+            return ""
+        with open(output_path, 'r') as output_file:
+            return output_file.read()
+
+
+def batch_endpoint():
+    batch_directory = os.getenv("OPENAI_BATCH_DIR")
+    return FileBatchEndpoint(batch_directory) if batch_directory else OpenAIBatchEndpoint()
+
+
+def save_batch_state(state_path: str, state: dict) -> None:
+    partial_path = f"{state_path}.partial"
+    with open(partial_path, 'w') as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(partial_path, state_path)
+
+
+def wait_for_batch(endpoint, state: dict, state_path: str) -> dict:
+    delay = BATCH_POLL_INITIAL_SECONDS
+    start_time = time.time()
+
+    while True:
+        status = endpoint.status(state["batch_id"])
+        if status != state.get("status"):
+            state["status"] = status
+            save_batch_state(state_path, state)
+            print(f"\tBatch {state['batch_id']} is {status}.")
+        if status in BATCH_FINISHED_STATUSES:
+            break
+        time.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, BATCH_POLL_MAX_SECONDS)
+
+    print(f"\tBatch {state['batch_id']} finished as {status} after {time.time() - start_time:.0f}s of polling.")
+
+    contents = {}
+    for line in endpoint.results(state["batch_id"]).splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        job = state["jobs"].get(record["custom_id"])
+        response = record.get("response") or {}
+        if job is None:
+            continue
+        if record.get("error") or response.get("status_code") != 200:
+            print(f"\t\033[91mBatch request for {batch_job_name(job)} failed: "
+                  f"{record.get('error') or response.get('body')}\033[0m")
+            continue
+        contents[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+
+    return collect_batch_results(state["jobs"], contents)
+
+
+def batch_job_name(job) -> str:
+    # A job is an output path, or [output path, chunk index, chunk count] for one chunk of it
+    return job if isinstance(job, str) else f"{job[0]} (chunk {job[1] + 1}/{job[2]})"
+
+
+def collect_batch_results(jobs: dict, contents: dict) -> dict:
+    results, partials = {}, {}
+    for custom_id, job in jobs.items():
+        if isinstance(job, str):
+            if custom_id in contents:
+                results[job] = contents[custom_id]
+            continue
+        output_path, index, count = job
+        partials.setdefault(output_path, [None] * count)[index] = contents.get(custom_id)
+
+    # Chunk notes of oversized transcripts are merged with live requests once all have arrived
+    for output_path, chunk_summaries in partials.items():
+        if any(summary is None for summary in chunk_summaries):
+            print(f"\t\033[91mMissing chunk summaries for {output_path}, not merging it\033[0m")
+            continue
+        print(f"\tMerging {len(chunk_summaries)} chunk summaries for {output_path}...")
+        results[output_path] = reduce_partials(chunk_summaries)
+    return results
+
+
+def batch_request(custom_id: str, system_prompt: str, content: str) -> str:
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": SUMMARY_MODEL,
+            "temperature": SUMMARY_TEMPERATURE,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": content},
+            ],
+        },
+    }) + "\n"
+
+
+def summarize_batch(transcriptions: dict, state_path: str) -> dict:
+    # Maps output paths to transcriptions in, output paths to Markdown summaries out.
+    # The state file lets an interrupted run pick its in-flight batch back up. Transcriptions
+    # over MAP_REDUCE_THRESHOLD_TOKENS are split like summarize() does: one batch request per
+    # chunk, then a live merge request (or a few, to condense) once the batch is back.
+    endpoint = batch_endpoint()
+    results = {}
+
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as state_file:
+            state = json.load(state_file)
+        print(f"\nResuming in-flight batch {state['batch_id']} ({len(state['jobs'])} requests)...")
+        results.update(wait_for_batch(endpoint, state, state_path))
+
+    remaining = {
+        output_path: transcription for output_path, transcription in transcriptions.items()
+        if output_path not in results
+    }
+    if remaining:
+        jobs = {}
+        input_path = f"{state_path}.input.jsonl"
+        with open(input_path, 'w') as input_file:
+            for output_path, transcription in remaining.items():
+                custom_id = hashlib.sha1(output_path.encode("utf-8")).hexdigest()[:16]
+                if count_tokens(transcription) <= MAP_REDUCE_THRESHOLD_TOKENS:
+                    jobs[custom_id] = output_path
+                    input_file.write(batch_request(custom_id, SUMMARY_SYSTEM_PROMPT, transcription))
+                    continue
+
+                chunks = chunk_content_defined(transcription, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+                print(f"\t{output_path} is over {MAP_REDUCE_THRESHOLD_TOKENS} tokens, "
+                      f"submitting it as {len(chunks)} chunks")
+                for index, chunk in enumerate(chunks):
+                    jobs[f"{custom_id}-{index}"] = [output_path, index, len(chunks)]
+                    input_file.write(batch_request(f"{custom_id}-{index}", CHUNK_SYSTEM_PROMPT, chunk))
+
+        print(f"\nSubmitting {len(jobs)} summarization requests as one batch...")
+        state = {"batch_id": endpoint.submit(input_path), "jobs": jobs, "submitted": time.time()}
+        save_batch_state(state_path, state)
+        os.remove(input_path)
+        results.update(wait_for_batch(endpoint, state, state_path))
+
+    return results
 
-    if response is None:
-        print(f"GPT summarization response is empty")
-        exit(-1)
-    print(f"Summarization received of length: {len(response.choices[0].message.content)}")
-    return response.choices[0].message.content
 
 def all_openai(audio_path: str, output_path: str, local: bool=True) -> None:
     try:
         with open(output_path, 'w') as output:
             output.write(
                 summarize(
-                    transcribe(audio_path, local)
+                    transcribe(audio_path, local).to_text()
                 )
             )
         exit(0)
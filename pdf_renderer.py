@@ -0,0 +1,94 @@
+# Renders HTML files to PDF with a bounded number of renders in flight.
+# With WeasyPrint installed, a pool of warm worker processes each parses the stylesheet
+# once and renders many documents; otherwise every document is one wkhtmltopdf run
+# (wkhtmltopdf joins all of its inputs into a single PDF, so it can't be batched).
+import os, io, time, shutil, threading, contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+DEFAULT_RENDER_WORKERS = os.cpu_count() or 1
+
+worker_stylesheet = None
+
+
+def weasyprint_available() -> bool:
+    try:
+        # WeasyPrint prints a long banner when its system libraries are missing
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            import weasyprint
+        return True
+    except Exception:
+        return False
+
+
+def init_weasyprint_worker(stylesheet: str) -> None:
+    global worker_stylesheet
+    import weasyprint
+    worker_stylesheet = weasyprint.CSS(string=stylesheet)
+
+
+def render_weasyprint(html_path: str, output_path: str) -> float:
+    import weasyprint
+    start_time = time.perf_counter()
+    weasyprint.HTML(filename=html_path, encoding="utf-8").write_pdf(output_path, stylesheets=[worker_stylesheet])
+    return time.perf_counter() - start_time
+
+
+class PdfRenderer:
+
+    def __init__(self, stylesheet: str, workers: int=DEFAULT_RENDER_WORKERS, engine: str=None):
+        self.stylesheet = stylesheet
+        self.workers = max(1, workers)
+        self.engine = engine or ("weasyprint" if weasyprint_available() else "wkhtmltopdf")
+        self.timings = []
+        self.lock = threading.Lock()
+
+        self.html_tail = "</body></html>"
+        if self.engine == "weasyprint":
+            self.html_head = "<html><head><meta charset=\"utf-8\"></head><body>"
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_weasyprint_worker,
+                initargs=(stylesheet,)
+            )
+        else:
+            if not shutil.which("wkhtmltopdf"):
+                print("\t\033[93mwkhtmltopdf was not found on PATH; PDF rendering will fail.\033[0m")
+            # The inline stylesheet is prepared once and reused for every document
+            self.html_head = f"<html><head><meta charset=\"utf-8\"><style>{stylesheet}</style></head><body>"
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def write_html(self, html_body: str, file) -> None:
+        # Written piecewise so the document is never assembled as one more string in memory
+        file.write(self.html_head)
+        file.write(html_body)
+        file.write(self.html_tail)
+
+    def render_wkhtmltopdf(self, html_path: str, output_path: str) -> float:
+        import pdfkit
+        start_time = time.perf_counter()
+        pdfkit.from_file(html_path, output_path, options={"encoding": "UTF-8"})
+        return time.perf_counter() - start_time
+
+    def submit(self, html_path: str, output_path: str):
+        if self.engine == "weasyprint":
+            return self.pool.submit(render_weasyprint, html_path, output_path)
+        return self.pool.submit(self.render_wkhtmltopdf, html_path, output_path)
+
+    def render(self, html_path: str, output_path: str) -> float:
+        render_time = self.submit(html_path, output_path).result()
+        with self.lock:
+            self.timings.append((output_path, render_time))
+        print(f"\tRendered {os.path.basename(output_path)} in {render_time:.2f}s ({self.engine})")
+        return render_time
+
+    def report(self) -> None:
+        if not self.timings:
+            return
+        total = sum(render_time for _, render_time in self.timings)
+        print(f"\n\033[1mRendered {len(self.timings)} PDFs with {self.engine} "
+              f"({self.workers} workers): {total:.1f}s total, {total / len(self.timings):.2f}s average\033[0m")
+        for output_path, render_time in self.timings:
+            print(f"\t{render_time:>7.2f}s  {os.path.basename(output_path)}")
+
+    def close(self) -> None:
+        self.pool.shutdown()
@@ -0,0 +1,112 @@
+import queue, threading, time
+
+DONE = object()
+
+
+class Stage:
+
+    def __init__(self, name: str, function, workers: int=1):
+        self.name = name
+        self.function = function
+        self.workers = max(1, workers)
+        self.lock = threading.Lock()
+        self.remaining_workers = self.workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.max_queue_depth = 0
+
+    def record(self, busy_time: float, wait_time: float, failed: bool) -> None:
+        with self.lock:
+            self.busy_time += busy_time
+            self.wait_time += wait_time
+            if failed:
+                self.failed += 1
+            else:
+                self.processed += 1
+
+
+class Pipeline:
+    # Each stage runs its own worker threads and feeds the next stage through a bounded
+    # queue, so a slow stage applies back-pressure instead of buffering every item.
+
+    def __init__(self, stages: list, queue_size: int=2, on_error=None):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+        self.on_error = on_error
+        self.results = []
+        self.results_lock = threading.Lock()
+        self.wall_time = 0.0
+
+    def put(self, index: int, item) -> None:
+        self.queues[index].put(item)
+        stage = self.stages[index]
+        depth = self.queues[index].qsize()
+        with stage.lock:
+            stage.max_queue_depth = max(stage.max_queue_depth, depth)
+
+    def work(self, index: int) -> None:
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+
+        try:
+            while True:
+                wait_start = time.time()
+                item = self.queues[index].get()
+                if item is DONE:
+                    break
+
+                start_time = time.time()
+                try:
+                    result = stage.function(item)
+                except BaseException as e:
+                    # SystemExit from a stage fails the item, not the worker thread
+                    stage.record(time.time() - start_time, start_time - wait_start, failed=True)
+                    if self.on_error:
+                        self.on_error(item, stage.name, e)
+                    continue
+                stage.record(time.time() - start_time, start_time - wait_start, failed=False)
+
+                if is_last:
+                    with self.results_lock:
+                        self.results.append(result)
+                else:
+                    self.put(index + 1, result)
+        finally:
+            # The last worker of a stage to finish closes the next stage, even if this one died
+            with stage.lock:
+                stage.remaining_workers -= 1
+                closing = stage.remaining_workers == 0
+            if closing and not is_last:
+                for _ in range(self.stages[index + 1].workers):
+                    self.queues[index + 1].put(DONE)
+
+    def run(self, items) -> list:
+        start_time = time.time()
+        threads = [
+            threading.Thread(target=self.work, args=(index,), name=f"{stage.name}-{worker}", daemon=True)
+            for index, stage in enumerate(self.stages)
+            for worker in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        for item in items:
+            self.put(0, item)
+        for _ in range(self.stages[0].workers):
+            self.queues[0].put(DONE)
+
+        for thread in threads:
+            thread.join()
+        self.wall_time = time.time() - start_time
+        return self.results
+
+    def report(self) -> None:
+        print(f"\n\033[1mPipeline finished in {self.wall_time:.1f}s\033[0m")
+        print(f"\t{'stage':<12}{'workers':>8}{'done':>6}{'failed':>8}{'busy (s)':>10}{'avg (s)':>9}{'idle (s)':>10}{'max queue':>11}")
+        for stage in self.stages:
+            handled = stage.processed + stage.failed
+            average = stage.busy_time / handled if handled else 0.0
+            print(f"\t{stage.name:<12}{stage.workers:>8}{stage.processed:>6}{stage.failed:>8}"
+                  f"{stage.busy_time:>10.1f}{average:>9.1f}{stage.wait_time:>10.1f}{stage.max_queue_depth:>11}")
@@ -0,0 +1,104 @@
+from text_chunker import count_tokens
+import os, time, threading
+
+FINAL_FLUSH_ATTEMPTS = 3
+FINAL_FLUSH_RETRY_SECONDS = 5
+
+
+class RollingSummarizer:
+    # Summarizes newly committed realtime transcript text in the background, every
+    # `interval` seconds or once `token_threshold` tokens are waiting, and keeps the
+    # partial notes on disk so a crash mid-session loses at most one interval.
+
+    def __init__(self, summarize_chunk, merge_summaries, markdown_path: str, interval: float=120,
+                 token_threshold: int=2000):
+        self.summarize_chunk = summarize_chunk
+        self.merge_summaries = merge_summaries
+        self.markdown_path = markdown_path
+        self.interval = interval
+        self.token_threshold = token_threshold
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = False
+        self.pending = []
+        self.pending_tokens = 0
+        self.partials = []
+
+        self.thread = threading.Thread(target=self.run, name="rolling-summary", daemon=True)
+        self.thread.start()
+
+    def add(self, text: str) -> None:
+        with self.lock:
+            self.pending.append(text)
+            self.pending_tokens += count_tokens(text)
+            if self.pending_tokens >= self.token_threshold:
+                self.wake.set()
+
+    def run(self) -> None:
+        while not self.stopping:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if not self.stopping:
+                self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            text = " ".join(self.pending)
+            self.pending, self.pending_tokens = [], 0
+        if not text.strip():
+            return
+
+        try:
+            self.partials.append(self.summarize_chunk(text))
+        except Exception as e:
+            # Keep the text so the next interval retries it
+            with self.lock:
+                self.pending.insert(0, text)
+                self.pending_tokens += count_tokens(text)
+            print(f"\r\nRolling summary failed, will retry: {e}\r")
+            return
+
+        self.write_partial()
+
+    def write_partial(self) -> None:
+        partial_path = f"{self.markdown_path}.partial"
+        with open(partial_path, 'w') as file:
+            file.write("\n\n".join(self.partials))
+            file.write(f"\n\n---\n\n*Live notes, last updated {time.strftime('%H:%M:%S')}*\n")
+        os.replace(partial_path, self.markdown_path)
+
+    def write_transcript(self, transcript: str) -> None:
+        # Last resort when the session can't be summarized: the notes so far followed by the whole transcript
+        partial_path = f"{self.markdown_path}.partial"
+        with open(partial_path, 'w') as file:
+            if self.partials:
+                file.write("\n\n".join(self.partials))
+                file.write("\n\n---\n\n")
+            file.write(f"## Transcript\n\n{transcript or ''}\n")
+        os.replace(partial_path, self.markdown_path)
+        print(f"\033[93mSaved the notes so far and the full transcript to {self.markdown_path}\033[0m")
+
+    def finish(self) -> str:
+        self.stopping = True
+        self.wake.set()
+        self.thread.join()
+
+        # The last interval's text only exists in pending, so retry it rather than dropping it
+        for attempt in range(FINAL_FLUSH_ATTEMPTS):
+            if attempt:
+                time.sleep(FINAL_FLUSH_RETRY_SECONDS * attempt)
+            self.flush()
+            if not self.pending:
+                break
+        if self.pending:
+            raise RuntimeError(f"Could not summarize the last {self.pending_tokens} tokens of the transcript after "
+                               f"{FINAL_FLUSH_ATTEMPTS} attempts")
+
+        if not self.partials:
+            return None
+        if len(self.partials) == 1:
+            return self.partials[0]
+
+        print(f"\nMerging {len(self.partials)} rolling summaries...")
+        return self.merge_summaries(self.partials)
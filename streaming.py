@@ -0,0 +1,69 @@
+import os, sys, time
+
+
+class StreamWriter:
+    # Echoes completion deltas to the terminal as they arrive, appends them to
+    # <output Markdown>.partial (moved over the .md only once the stream completes, so a
+    # failed stream leaves earlier notes alone), and times the first token and the token rate.
+
+    def __init__(self, provider: str, markdown_path: str=None, echo: bool=True):
+        self.provider = provider
+        self.echo = echo
+        self.markdown_path = markdown_path
+        self.partial_path = f"{markdown_path}.partial" if markdown_path else None
+        self.file = open(self.partial_path, 'w') if markdown_path else None
+        self.parts = []
+        self.start_time = time.perf_counter()
+        self.first_token_time = None
+        self.end_time = None
+
+    def write(self, delta: str) -> None:
+        if not delta:
+            return
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.parts.append(delta)
+        if self.echo:
+            sys.stdout.write(delta)
+            sys.stdout.flush()
+        if self.file:
+            self.file.write(delta)
+            self.file.flush()
+
+    def reset(self) -> None:
+        # A retried stream starts over rather than appending to the failed attempt's text
+        if not self.parts:
+            return
+        self.parts = []
+        self.first_token_time = None
+        if self.echo:
+            print(f"\n\033[93m{self.provider}: stream interrupted, restarting\033[0m")
+        if self.file:
+            self.file.seek(0)
+            self.file.truncate()
+
+    def abort(self) -> None:
+        if self.file:
+            self.file.close()
+            os.remove(self.partial_path)
+        if self.echo and self.parts:
+            print()
+
+    def close(self, completion_tokens: int=None, generation_seconds: float=None) -> str:
+        from text_chunker import count_tokens
+
+        self.end_time = time.perf_counter()
+        if self.file:
+            self.file.close()
+            os.replace(self.partial_path, self.markdown_path)
+        text = "".join(self.parts)
+        if self.echo:
+            print()
+
+        if self.first_token_time is not None:
+            completion_tokens = completion_tokens or count_tokens(text)
+            generation_seconds = generation_seconds or (self.end_time - self.first_token_time)
+            tokens_per_second = completion_tokens / generation_seconds if generation_seconds else float("inf")
+            print(f"\033[94m{self.provider}: first token after {self.first_token_time - self.start_time:.2f}s, "
+                  f"{completion_tokens} tokens at {tokens_per_second:.1f} tokens/s\033[0m")
+        return text
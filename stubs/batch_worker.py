@@ -0,0 +1,56 @@
+# Processes batches submitted to openai_handler.FileBatchEndpoint, i.e. runs with
+# OPENAI_BATCH_DIR=<directory>. Each request is answered by the stub chat completion.
+from stubs.openai_server import chat_completion
+import os, json, time, argparse
+
+
+def set_status(batch_directory: str, status: str) -> None:
+    with open(os.path.join(batch_directory, "status"), 'w') as status_file:
+        status_file.write(status)
+
+
+def process_batch(batch_directory: str, delay: float) -> None:
+    set_status(batch_directory, "in_progress")
+    time.sleep(delay)
+
+    partial_path = os.path.join(batch_directory, "output.jsonl.partial")
+    with open(os.path.join(batch_directory, "input.jsonl"), 'r') as input_file, open(partial_path, 'w') as output_file:
+        for index, line in enumerate(input_file):
+            request = json.loads(line)
+            output_file.write(json.dumps({
+                "id": f"batch_req_{index}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": chat_completion(request["body"])},
+                "error": None,
+            }) + "\n")
+    os.replace(partial_path, os.path.join(batch_directory, "output.jsonl"))
+    set_status(batch_directory, "completed")
+
+
+def run(directory: str, delay: float=0.0, once: bool=False) -> None:
+    while True:
+        for batch_id in sorted(os.listdir(directory)):
+            batch_directory = os.path.join(directory, batch_id)
+            status_path = os.path.join(batch_directory, "status")
+            if os.path.exists(status_path):
+                with open(status_path, 'r') as status_file:
+                    if status_file.read().strip() == "validating":
+                        print(f"Processing {batch_id}")
+                        process_batch(batch_directory, delay)
+        if once:
+            return
+        time.sleep(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a directory-based stand-in for the OpenAI Batch API.")
+    parser.add_argument("directory", help="The directory OPENAI_BATCH_DIR points at.")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds each batch stays in progress.")
+    parser.add_argument("--once", action="store_true", help="Process pending batches once and exit.")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    try:
+        run(args.directory, args.delay, args.once)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,217 @@
+# Minimal Ollama API stand-in for running local summarization offline.
+# Point the client at it with LLAMA_URL=http://127.0.0.1:<port>
+# Like the real server it loads one model at a time, reloads when the model or num_ctx
+# changes, defaults to a 2048 token context and silently keeps only the end of a longer prompt.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timezone
+import json, time, argparse, threading
+
+DEFAULT_CONTEXT = 2048
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def fake_summary(content: str) -> str:
+    words = content.split()
+    return "# Stub Summary\n\n" + "\n".join(
+        f"- {' '.join(words[index:index + 12])}" for index in range(0, min(len(words), 120), 12)
+    )
+
+
+class OllamaState:
+
+    def __init__(self, context_length: int, load_seconds: float, token_delay: float, num_parallel: int):
+        self.context_length = context_length
+        self.load_seconds = load_seconds
+        self.token_delay = token_delay
+        self.slots = threading.Semaphore(num_parallel)
+        self.lock = threading.Lock()
+        self.loaded = None
+        self.expires_at = 0.0
+        self.loads = 0
+        self.requests = 0
+        self.truncated = 0
+        self.max_concurrent = 0
+        self.running = 0
+
+    def load(self, model: str, num_ctx: int, keep_alive) -> float:
+        # Returns the seconds spent loading; zero when the same model and context are still resident
+        with self.lock:
+            load_seconds = 0.0
+            if self.loaded != (model, num_ctx) or time.time() > self.expires_at:
+                time.sleep(self.load_seconds)
+                self.loaded = (model, num_ctx)
+                self.loads += 1
+                load_seconds = self.load_seconds
+            self.expires_at = time.time() + parse_duration(keep_alive)
+            return load_seconds
+
+    def generate(self, model: str, prompt: str, options: dict, keep_alive) -> dict:
+        num_ctx = int(options.get("num_ctx") or DEFAULT_CONTEXT)
+        load_seconds = self.load(model, num_ctx, keep_alive)
+
+        prompt_tokens = len(prompt) // 4
+        with self.lock:
+            self.requests += 1
+            if prompt_tokens > num_ctx:
+                self.truncated += 1
+        if prompt_tokens > num_ctx:
+            prompt = prompt[-num_ctx * 4:]
+            prompt_tokens = num_ctx
+
+        with self.slots:
+            with self.lock:
+                self.running += 1
+                self.max_concurrent = max(self.max_concurrent, self.running)
+            content = fake_summary(prompt)
+            eval_seconds = len(content) // 4 * self.token_delay
+            time.sleep(eval_seconds)
+            with self.lock:
+                self.running -= 1
+
+        return {
+            "content": content,
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(content) // 4,
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    def ps(self) -> dict:
+        with self.lock:
+            models = []
+            if self.loaded and time.time() <= self.expires_at:
+                models.append({
+                    "name": self.loaded[0], "model": self.loaded[0], "context_length": self.loaded[1],
+                    "expires_at": datetime.fromtimestamp(self.expires_at, timezone.utc).isoformat(),
+                })
+            # Not part of the Ollama API: counters for checks against this stub
+            stub = {"loads": self.loads, "requests": self.requests, "truncated_requests": self.truncated,
+                    "max_concurrent": self.max_concurrent}
+            return {"models": models, "stub": stub}
+
+
+def parse_duration(keep_alive) -> float:
+    if keep_alive is None:
+        return 300.0
+    if isinstance(keep_alive, (int, float)):
+        return float(keep_alive) if keep_alive >= 0 else float("inf")
+    units = {"s": 1, "m": 60, "h": 3600}
+    if keep_alive[-1:] in units:
+        return float(keep_alive[:-1]) * units[keep_alive[-1]]
+    return float(keep_alive)
+
+
+class OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_lines(self, model: str, result: dict, message: bool) -> None:
+        # Newline-delimited JSON, one object per word and a final one with the counters
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_line(payload: dict) -> None:
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for word in result["content"].split(" "):
+            delta = {"message": {"role": "assistant", "content": word + " "}} if message else {"response": word + " "}
+            send_line({"model": model, "created_at": now(), **delta, "done": False})
+        final = {"message": {"role": "assistant", "content": ""}} if message else {"response": ""}
+        send_line({"model": model, "created_at": now(), **final, "done": True, "done_reason": "stop",
+                   **{key: value for key, value in result.items() if key != "content"}})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def respond(self, model: str, result: dict, message: bool, stream: bool) -> None:
+        if stream:
+            self.stream_lines(model, result, message)
+            return
+        content = {"message": {"role": "assistant", "content": result["content"]}} if message \
+            else {"response": result["content"]}
+        self.send_json(200, {"model": model, "created_at": now(), **content, "done": True, "done_reason": "stop",
+                             **{key: value for key, value in result.items() if key != "content"}})
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/ps":
+            self.send_json(200, self.state.ps())
+        elif self.path.rstrip("/") == "/api/tags":
+            self.send_json(200, {"models": []})
+        else:
+            self.send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "")
+        options = request.get("options") or {}
+        # The real API streams unless told otherwise
+        stream = request.get("stream", True)
+
+        if self.path.rstrip("/") == "/api/show":
+            self.send_json(200, {
+                "modelfile": "", "parameters": "", "template": "{{ .Prompt }}",
+                "details": {"family": "llama", "parameter_size": "8.0B", "quantization_level": model.rsplit("-", 1)[-1]},
+                "model_info": {"general.architecture": "llama", "llama.context_length": self.state.context_length},
+            })
+        elif self.path.rstrip("/") == "/api/generate":
+            if not request.get("prompt"):
+                # An empty prompt only loads the model
+                load_seconds = self.state.load(model, int(options.get("num_ctx") or DEFAULT_CONTEXT),
+                                               request.get("keep_alive"))
+                self.send_json(200, {"model": model, "created_at": now(), "response": "", "done": True,
+                                     "done_reason": "load", "load_duration": int(load_seconds * 1e9)})
+                return
+            result = self.state.generate(model, request.get("system", "") + request["prompt"], options,
+                                         request.get("keep_alive"))
+            self.respond(model, result, message=False, stream=stream)
+        elif self.path.rstrip("/") == "/api/chat":
+            messages = request.get("messages", [])
+            prompt = "\n".join(message.get("content", "") for message in messages)
+            result = self.state.generate(model, prompt, options, request.get("keep_alive"))
+            # Summarize the user's text rather than the system prompt in front of it
+            result["content"] = fake_summary(messages[-1].get("content", "") if messages else "")
+            self.respond(model, result, message=True, stream=stream)
+        else:
+            self.send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+
+def serve(port: int=11434, context_length: int=131072, load_seconds: float=0.0, token_delay: float=0.0,
+          num_parallel: int=1) -> ThreadingHTTPServer:
+    handler = type("ConfiguredOllamaHandler", (OllamaHandler,), {
+        "state": OllamaState(context_length, load_seconds, token_delay, num_parallel),
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local Ollama API stub.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--context-length", type=int, default=131072, help="Trained context length reported by /api/show.")
+    parser.add_argument("--load-seconds", type=float, default=0.0, help="Seconds a model (re)load takes.")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per generated token.")
+    parser.add_argument("--num-parallel", type=int, default=1, help="Requests generated at once, like OLLAMA_NUM_PARALLEL.")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.context_length, args.load_seconds, args.token_delay, args.num_parallel)
+    print(f"Stub Ollama API listening on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,168 @@
+# Minimal OpenAI-compatible stand-in for running the pipeline offline.
+# Point the client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email.policy import HTTP
+import json, time, random, argparse, itertools
+
+completion_ids = itertools.count(1)
+
+
+def fake_summary(messages: list) -> str:
+    content = messages[-1]["content"] if messages else ""
+    words = content.split()
+    return "# Stub Summary\n\n" + "\n".join(
+        f"- {' '.join(words[index:index + 12])}" for index in range(0, min(len(words), 120), 12)
+    )
+
+
+def chat_completion(request: dict) -> dict:
+    content = fake_summary(request.get("messages", []))
+    prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+    return {
+        "id": f"chatcmpl-stub-{next(completion_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict:
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        fields[name] = (part.get_filename(), part.get_payload(decode=True))
+    return fields
+
+
+def audio_transcription(fields: dict, bytes_per_second: int=3000) -> dict:
+    # Assume ~24 kbps uploads to derive a duration, then emit one segment per 10 seconds
+    filename, audio = fields.get("file", ("audio", b""))
+    duration = max(len(audio) / bytes_per_second, 1.0)
+    segments = []
+    for index, start in enumerate(range(0, int(duration) + 1, 10)):
+        end = min(start + 10, duration)
+        if end <= start:
+            break
+        segments.append({"id": index, "start": float(start), "end": float(end), "text": f" {filename} at {start}s."})
+
+    response_format = fields.get("response_format", (None, b"json"))[1].decode("utf-8")
+    text = "".join(segment["text"] for segment in segments).strip()
+    if response_format == "verbose_json":
+        return {"task": "transcribe", "language": "english", "duration": duration, "text": text,
+                "segments": segments}
+    return {"text": text}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    retry_after = 1.0
+    token_delay = 0.01
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict, headers: dict=None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def stream_completion(self, completion: dict) -> None:
+        # Server-sent events, one chunk per word, ending with a usage chunk and [DONE]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload: str) -> None:
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        base = {key: completion[key] for key in ("id", "created", "model")}
+        content = completion["choices"][0]["message"]["content"]
+        for word in content.split(" "):
+            send_event(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": word + " "}, "finish_reason": None}
+            ]}))
+            time.sleep(self.token_delay)
+        send_event(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": completion["usage"]}))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = self.read_body()
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if random.random() < self.error_rate:
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"Retry-After": f"{self.retry_after:g}"}
+            )
+            return
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            request = json.loads(body)
+            if request.get("stream"):
+                self.stream_completion(chat_completion(request))
+            else:
+                self.send_json(200, chat_completion(request))
+        elif self.path.rstrip("/").endswith("/audio/transcriptions"):
+            fields = parse_multipart(self.headers.get("Content-Type", ""), body)
+            self.send_json(200, audio_transcription(fields))
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "invalid_request_error"}})
+
+
+def serve(port: int=8000, latency: float=0.0, jitter: float=0.0, error_rate: float=0.0,
+          retry_after: float=1.0) -> ThreadingHTTPServer:
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "retry_after": retry_after,
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible stub API.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra random seconds per request.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with each 429.")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.jitter, args.error_rate, args.retry_after)
+    print(f"Stub OpenAI API listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
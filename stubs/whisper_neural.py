@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Stand-in for the whisper-neural (whisper.cpp) binary. Point whisper_coreML at it with
+# WHISPER_NEURAL_BIN=stubs/whisper_neural.py; it accepts the same -m/-f/-t arguments and
+# prints one "[t0 --> t1]   text" line per SEGMENT_SECONDS of non-silent audio, paced by
+# WHISPER_STUB_RTF seconds of wall time per second of audio.
+import os, sys, time, wave, argparse
+
+try:
+    import audioop
+except ImportError:
+    import pyaudioop as audioop
+
+SEGMENT_SECONDS = 5
+SILENCE_RMS = 100
+WORDS = (
+    "the gradient of the loss with respect to each weight is computed by backpropagation "
+    "and a hash table trades memory for constant time lookups while the scheduler picks "
+    "the next runnable process according to its priority and recent cpu usage"
+).split()
+
+
+def format_timestamp(ms: int) -> str:
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def segment_text(index: int) -> str:
+    start = (index * 7) % len(WORDS)
+    return " ".join(WORDS[(start + offset) % len(WORDS)] for offset in range(12)).capitalize() + "."
+
+
+def run(audio_path: str, rtf: float, load_seconds: float) -> int:
+    print(f"whisper_init_from_file_with_params_no_state: loading model (stub)", file=sys.stderr)
+    time.sleep(load_seconds)
+
+    try:
+        wav = wave.open(audio_path, 'rb')
+    except (OSError, wave.Error, EOFError) as e:
+        print(f"error: failed to read WAV file '{audio_path}': {e}", file=sys.stderr)
+        return 1
+
+    with wav:
+        if wav.getframerate() != 16000 or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+            print("error: WAV file must be 16 kHz mono 16-bit PCM", file=sys.stderr)
+            return 1
+
+        frames_per_segment = SEGMENT_SECONDS * wav.getframerate()
+        index = 0
+        while True:
+            frames = wav.readframes(frames_per_segment)
+            if not frames:
+                break
+            seconds = len(frames) / 2 / wav.getframerate()
+            time.sleep(seconds * rtf)
+
+            start_ms = index * SEGMENT_SECONDS * 1000
+            if audioop.rms(frames, 2) > SILENCE_RMS:
+                end_ms = start_ms + round(seconds * 1000)
+                print(f"[{format_timestamp(start_ms)} --> {format_timestamp(end_ms)}]   {segment_text(index)}", flush=True)
+            index += 1
+
+    print(f"whisper_print_timings: total time = {time.process_time() * 1000:.2f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake whisper-neural binary for benchmarks.")
+    parser.add_argument("-m", "--model")
+    parser.add_argument("-f", "--file", required=True)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    sys.exit(run(
+        args.file,
+        float(os.getenv("WHISPER_STUB_RTF", "0.01")),
+        float(os.getenv("WHISPER_STUB_LOAD_SECONDS", "0.1"))
+    ))
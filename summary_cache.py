@@ -0,0 +1,58 @@
+from disk_cache import DiskCache, hash_key
+import os, time, hashlib, threading
+
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("NOTETAKER_SUMMARY_CACHE_MB", "64")) * 1024 * 1024
+
+cache = DiskCache("summaries", SUMMARY_CACHE_MAX_BYTES)
+enabled = True
+
+stats = {"hits": 0, "misses": 0, "tokens_saved": 0}
+stats_lock = threading.Lock()
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model: str, system_prompt: str, temperature: float, content: str) -> str:
+    # A prompt or model change misses every entry; an edited transcript only misses its changed chunks
+    return hash_key(model, text_hash(system_prompt), temperature, text_hash(content))
+
+
+def lookup(key: str):
+    if not enabled:
+        return None
+    entry = cache.get(key)
+    with stats_lock:
+        if entry:
+            stats["hits"] += 1
+            stats["tokens_saved"] += entry["input_tokens"] + entry["output_tokens"]
+        else:
+            stats["misses"] += 1
+    return entry["summary"] if entry else None
+
+
+def store(key: str, summary: str, model: str, input_tokens: int, output_tokens: int) -> None:
+    if not enabled or not summary:
+        return
+    cache.put(key, {
+        "summary": summary,
+        "model": model,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "created": time.time(),
+    })
+
+
+def report() -> None:
+    with stats_lock:
+        hits, misses, tokens_saved = stats["hits"], stats["misses"], stats["tokens_saved"]
+    if not hits and not misses:
+        return
+    print(f"\n\033[1mSummary cache:\033[0m {hits} hit{'s' if hits != 1 else ''}, "
+          f"{misses} miss{'es' if misses != 1 else ''}, {tokens_saved} tokens saved")
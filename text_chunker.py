@@ -0,0 +1,129 @@
+import re, hashlib, functools
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Without tiktoken fall back to the usual ~4 characters per token estimate
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def split_units(text: str) -> list:
+    # Timestamped transcripts split on segment lines, plain text on sentence ends
+    lines = [line for line in text.splitlines() if line.strip()]
+    units = []
+    for line in lines:
+        if line.startswith("["):
+            units.append(line)
+        else:
+            units.extend(sentence for sentence in SENTENCE_PATTERN.split(line) if sentence)
+    return units
+
+
+def split_oversized(unit: str, max_tokens: int) -> list:
+    words = unit.split()
+    pieces, current, current_tokens = [], [], 0
+    for word in words:
+        word_tokens = count_tokens(word + " ")
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def token_units(text: str, max_tokens: int) -> list:
+    units = []
+    for unit in split_units(text):
+        unit_tokens = count_tokens(unit)
+        if unit_tokens > max_tokens:
+            units.extend((piece, count_tokens(piece)) for piece in split_oversized(unit, max_tokens))
+        else:
+            units.append((unit, unit_tokens))
+    return units
+
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int=0) -> list:
+    units = token_units(text, max_tokens)
+
+    chunks = []
+    current, current_tokens = [], 0
+    for unit, unit_tokens in units:
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("\n".join(piece for piece, _ in current))
+
+            # Carry the trailing units into the next chunk as overlap context
+            carried, carried_tokens = [], 0
+            for piece, piece_tokens in reversed(current):
+                if carried_tokens + piece_tokens > overlap_tokens or carried_tokens + piece_tokens + unit_tokens > max_tokens:
+                    break
+                carried.insert(0, (piece, piece_tokens))
+                carried_tokens += piece_tokens
+            current, current_tokens = carried, carried_tokens
+
+        current.append((unit, unit_tokens))
+        current_tokens += unit_tokens
+
+    if current:
+        chunks.append("\n".join(piece for piece, _ in current))
+    return chunks
+
+
+def unit_fraction(unit: str) -> float:
+    # Depends only on the unit's own text, so the same sentence scores the same wherever it moves
+    digest = hashlib.blake2b(unit.strip().encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def chunk_content_defined(text: str, max_tokens: int, overlap_tokens: int=0) -> list:
+    # Like chunk_text, but chunks end where the content says so rather than every max_tokens:
+    # past a minimum size, a unit ends its chunk when its hash falls under a threshold. An
+    # edit then only moves the boundaries around it, and every other chunk comes out
+    # byte-identical to the previous run (which the summary cache relies on).
+    if overlap_tokens < 0:
+        raise ValueError(f"overlap_tokens must not be negative, got {overlap_tokens}")
+    if max_tokens <= overlap_tokens:
+        raise ValueError(f"max_tokens ({max_tokens}) must exceed overlap_tokens ({overlap_tokens})")
+    group_tokens = max_tokens - overlap_tokens
+    min_tokens = group_tokens // 3
+    spread_tokens = max(1, group_tokens * 2 // 3 - min_tokens)
+
+    groups, current, current_tokens = [], [], 0
+    for unit, unit_tokens in token_units(text, group_tokens):
+        if current and current_tokens + unit_tokens > group_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append((unit, unit_tokens))
+        current_tokens += unit_tokens
+        if current_tokens >= min_tokens and unit_fraction(unit) < unit_tokens / spread_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+    if current:
+        groups.append(current)
+
+    chunks = []
+    for index, group in enumerate(groups):
+        # Carry the trailing units of the previous chunk in as overlap context
+        carried, carried_tokens = [], 0
+        for piece, piece_tokens in reversed(groups[index - 1] if index else []):
+            if carried_tokens + piece_tokens > overlap_tokens:
+                break
+            carried.insert(0, (piece, piece_tokens))
+            carried_tokens += piece_tokens
+        chunks.append("\n".join(piece for piece, _ in carried + group))
+    return chunks
@@ -0,0 +1,176 @@
+# Nested timing spans for the pipeline stages. Disabled (and nearly free) unless enable()
+# is called; main.py turns it on with --trace and --profile.
+import os, io, json, time, pstats, itertools, threading, contextlib
+
+spans = []
+spans_lock = threading.Lock()
+local = threading.local()
+span_ids = itertools.count(1)
+
+enabled = False
+trace_path = None
+profile_dir = None
+epoch = time.perf_counter()
+
+
+def enable(path: str=None, profile: str=None) -> None:
+    # path ending in .json writes a Chrome trace (chrome://tracing, Perfetto), anything else JSON lines.
+    # profile is a directory for per-stage cProfile dumps; it also turns on tracemalloc peaks.
+    global enabled, trace_path, profile_dir
+    enabled = True
+    trace_path = path
+    profile_dir = profile
+    if profile_dir:
+        import tracemalloc
+        os.makedirs(profile_dir, exist_ok=True)
+        tracemalloc.start()
+
+
+def traced_memory() -> (int, int):
+    import tracemalloc
+    return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+
+
+def reset_memory_peak() -> None:
+    import tracemalloc
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    # Yields the attribute dict so counts known only at the end (bytes out, tokens) can be added
+    if not enabled:
+        yield attributes
+        return
+
+    stack = getattr(local, "stack", None)
+    if stack is None:
+        stack = local.stack = []
+    parent = stack[-1] if stack else None
+    record = {
+        "id": next(span_ids),
+        "parent": parent["id"] if parent else None,
+        "name": name,
+        "thread": threading.get_ident(),
+        "attributes": attributes,
+        "memory_peak": 0,
+    }
+
+    # tracemalloc has one global peak: fold it into the parent before resetting it for this span
+    if parent is not None:
+        parent["memory_peak"] = max(parent["memory_peak"], traced_memory()[1])
+    reset_memory_peak()
+    record["memory_start"] = traced_memory()[0]
+
+    profiler = None
+    if profile_dir and parent is None:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread's stage already holds the profiler
+            profiler = None
+
+    stack.append(record)
+    record["start"] = time.perf_counter()
+    try:
+        yield attributes
+    except BaseException as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - record["start"]
+        stack.pop()
+        if profiler is not None:
+            profiler.disable()
+            record["profile"] = profiler
+        if profile_dir:
+            record["memory_peak"] = max(record["memory_peak"], traced_memory()[1])
+            if parent is not None:
+                parent["memory_peak"] = max(parent["memory_peak"], record["memory_peak"])
+            reset_memory_peak()
+        with spans_lock:
+            spans.append(record)
+
+
+def span_dict(record: dict) -> dict:
+    return {
+        "id": record["id"],
+        "parent": record["parent"],
+        "name": record["name"],
+        "thread": record["thread"],
+        "start_seconds": round(record["start"] - epoch, 6),
+        "duration_seconds": round(record["duration"], 6),
+        "memory_peak_bytes": record["memory_peak"] if profile_dir else None,
+        "memory_growth_bytes": record["memory_peak"] - record["memory_start"] if profile_dir else None,
+        **record["attributes"],
+    }
+
+
+def write_trace(path: str) -> None:
+    with spans_lock:
+        finished = sorted(spans, key=lambda record: record["start"])
+
+    with open(path, 'w') as file:
+        if path.endswith(".json"):
+            events = [{
+                "name": record["name"],
+                "ph": "X",
+                "ts": round((record["start"] - epoch) * 1e6),
+                "dur": round(record["duration"] * 1e6),
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {key: value for key, value in span_dict(record).items()
+                         if key not in ("name", "start_seconds", "duration_seconds", "thread")},
+            } for record in finished]
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        else:
+            for record in finished:
+                file.write(json.dumps(span_dict(record), default=str) + "\n")
+
+
+def write_profiles(directory: str, top: int=15) -> None:
+    with spans_lock:
+        profiled = [record for record in spans if "profile" in record]
+
+    for record in sorted(profiled, key=lambda record: record["start"]):
+        dump_path = os.path.join(directory, f"{record['id']:03d}_{record['name']}.prof")
+        record["profile"].dump_stats(dump_path)
+
+        output = io.StringIO()
+        pstats.Stats(record["profile"], stream=output).sort_stats("cumulative").print_stats(top)
+        print(f"\n\033[1m{record['name']}\033[0m: {record['duration']:.2f}s, "
+              f"peak traced memory {record['memory_peak'] / 1e6:.1f} MB "
+              f"(+{(record['memory_peak'] - record['memory_start']) / 1e6:.1f} MB during the stage, {dump_path})")
+        print("\n".join(line for line in output.getvalue().splitlines()[6:] if line.strip()))
+
+
+def report() -> None:
+    with spans_lock:
+        finished = list(spans)
+    if not finished:
+        return
+
+    totals = {}
+    for record in finished:
+        count, seconds, growth = totals.get(record["name"], (0, 0.0, 0))
+        totals[record["name"]] = (count + 1, seconds + record["duration"],
+                                  max(growth, record["memory_peak"] - record["memory_start"]))
+
+    print("\n\033[1mStage timings:\033[0m")
+    for name, (count, seconds, growth) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        memory = f", allocated up to {growth / 1e6:.1f} MB" if profile_dir else ""
+        print(f"\t{name}: {seconds:.2f}s over {count} span{'s' if count != 1 else ''}{memory}")
+
+
+def finish() -> None:
+    if not enabled:
+        return
+    report()
+    if profile_dir:
+        write_profiles(profile_dir)
+    if trace_path:
+        write_trace(trace_path)
+        print(f"\nTrace written to {trace_path}")
@@ -0,0 +1,43 @@
+from disk_cache import DiskCache, hash_key
+import os, time
+
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("NOTETAKER_TRANSCRIPT_CACHE_MB", "512")) * 1024 * 1024
+
+cache = DiskCache("transcripts", TRANSCRIPT_CACHE_MAX_BYTES)
+
+
+def cache_key(audio_hash: str, backend: str, model: str, **flags) -> str:
+    return hash_key(audio_hash, backend, model, **flags)
+
+
+def request_key(audio_hash: str, backend: str, local: bool, **flags) -> str:
+    # The requested backend (None when it is left to calibration) rather than the one it resolved to
+    return hash_key(audio_hash, "request", backend, local, **flags)
+
+
+def lookup(key: str):
+    entry = cache.get(key)
+    if entry:
+        entry["segments"] = [tuple(segment) for segment in entry["segments"]]
+    return entry
+
+
+def lookup_request(key: str):
+    # Request entries only point at the transcript entry they resolved to
+    alias = cache.get(key)
+    return lookup(alias["key"]) if alias else None
+
+
+def store(key: str, text: str, segments: list, backend: str, model: str) -> None:
+    # Segments are (start_ms, end_ms, text) tuples
+    cache.put(key, {
+        "text": text,
+        "segments": [list(segment) for segment in segments],
+        "backend": backend,
+        "model": model,
+        "created": time.time(),
+    })
+
+
+def store_request(key: str, transcript_key: str) -> None:
+    cache.put(key, {"key": transcript_key})
@@ -0,0 +1,134 @@
+from disk_cache import CACHE_ROOT
+import os, json, time, queue, socket, socketserver, threading, argparse
+
+SOCKET_PATH = os.getenv("NOTETAKER_DAEMON_SOCKET", os.path.join(CACHE_ROOT, "transcriber.sock"))
+CONNECT_TIMEOUT = 0.5
+# Covers queue wait plus inference; a client never waits forever on a stuck daemon
+SUBMIT_TIMEOUT = float(os.getenv("NOTETAKER_DAEMON_TIMEOUT", "7200"))
+
+
+def request(message: dict, timeout: float=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(CONNECT_TIMEOUT)
+        connection.connect(SOCKET_PATH)
+        connection.settimeout(timeout)
+        connection.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with connection.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Transcription daemon closed the connection without replying")
+    return json.loads(line)
+
+
+def status():
+    # Returns the daemon's status dict, or None when no daemon is listening
+    try:
+        return request({"op": "status"}, timeout=CONNECT_TIMEOUT)
+    except (OSError, ValueError):
+        return None
+
+
+def submit(audio_path: str, timeout: float=SUBMIT_TIMEOUT) -> dict:
+    try:
+        response = request({"op": "transcribe", "audio_path": os.path.abspath(audio_path)}, timeout=timeout)
+    except socket.timeout as e:
+        raise RuntimeError(f"Transcription daemon did not reply within {timeout:.0f}s") from e
+    if "error" in response:
+        raise RuntimeError(f"Transcription daemon failed: {response['error']}")
+    response["segments"] = [tuple(segment) for segment in response["segments"]]
+    return response
+
+
+class TranscriptionDaemon:
+
+    def __init__(self, model_size: str):
+        import openai_handler
+
+        self.model_size = model_size
+        self.jobs = queue.Queue()
+        self.completed = 0
+
+        start_time = time.time()
+        self.model = openai_handler.load_whisper_model(model_size)
+        self.load_time = time.time() - start_time
+        print(f"Loaded {model_size} in {self.load_time:.2f}s, ready for jobs on {SOCKET_PATH}")
+
+        threading.Thread(target=self.work, daemon=True).start()
+
+    def work(self):
+        import openai_handler
+
+        while True:
+            audio_path, queued_at, reply, done = self.jobs.get()
+            started_at = time.time()
+            try:
+                text, segments = openai_handler.transcribe_local(audio_path, whisper_model=self.model)
+                reply["text"] = text
+                reply["segments"] = [list(segment) for segment in segments]
+            except BaseException as e:
+                # Anything, even SystemExit, becomes this job's error; the worker keeps serving
+                reply["error"] = str(e) if isinstance(e, Exception) else f"{type(e).__name__}: {e}"
+            finally:
+                finished_at = time.time()
+                reply["model"] = self.model_size
+                reply["load_time"] = self.load_time
+                reply["queue_time"] = started_at - queued_at
+                reply["inference_time"] = finished_at - started_at
+                self.completed += 1
+                print(f"\tTranscribed {audio_path}: waited {reply['queue_time']:.2f}s, "
+                      f"inference {reply['inference_time']:.2f}s")
+                done.set()
+
+    def handle(self, message: dict) -> dict:
+        if message.get("op") == "status":
+            return {
+                "model": self.model_size,
+                "load_time": self.load_time,
+                "queued": self.jobs.qsize(),
+                "completed": self.completed,
+            }
+        if message.get("op") == "transcribe":
+            reply = {}
+            done = threading.Event()
+            self.jobs.put((message["audio_path"], time.time(), reply, done))
+            done.wait()
+            return reply
+        return {"error": f"Unknown operation: {message.get('op')}"}
+
+
+def serve(model_size: str="base"):
+    if status():
+        print(f"A transcription daemon is already listening on {SOCKET_PATH}")
+        return
+    if os.path.exists(SOCKET_PATH):
+        os.remove(SOCKET_PATH)
+    os.makedirs(os.path.dirname(SOCKET_PATH), exist_ok=True)
+
+    daemon = TranscriptionDaemon(model_size)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line:
+                return
+            try:
+                response = daemon.handle(json.loads(line))
+            except Exception as e:
+                response = {"error": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+    with socketserver.ThreadingUnixStreamServer(SOCKET_PATH, Handler) as server:
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down transcription daemon.")
+        finally:
+            os.remove(SOCKET_PATH)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep a Whisper model loaded and serve transcription jobs over a Unix socket.")
+    parser.add_argument("--model", default="base", help="openai-whisper model size to keep loaded (default = base).")
+    args = parser.parse_args()
+    serve(args.model)